@@ -3,8 +3,8 @@ load_dotenv()  # This must be before any other imports
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from utils.database import init_db, get_or_create_user, get_user_data, get_user_by_email, create_new_user, save_chat_message, get_chat_history
-from utils.components import init_spotify_player, interpret_bmi, get_ai_response  # Added get_ai_response here
+from utils.database import init_db, get_or_create_user, get_user_data, get_activity_count, get_user_by_email, create_new_user, save_chat_message, get_chat_history
+from utils.components import init_spotify_player, interpret_bmi
 
 # Page configuration
 st.set_page_config(
@@ -20,7 +20,7 @@ init_spotify_player()
 st.sidebar.markdown("---")  # Add a divider
 st.sidebar.markdown("<div style='text-align: center; color: #555;'><small>Created by: <b>MMD</b><br><a href='https://portfolio.mmdlab.tech/' target='_blank'>Miqueas Molina Delgado</a></small></div>", unsafe_allow_html=True)
 
-# Initialize database
+# Initialize database (migrations run once per process, later reruns are a no-op)
 init_db()
 
 # Session state initialization
@@ -46,7 +46,11 @@ if not st.session_state.authenticated:
             user_id = get_user_by_email(login_email)
             if user_id:
                 try:
-                    user_data = get_user_data(user_id)
+                    # Login only needs the profile; the recent chat turns are read separately
+                    user_data = get_user_data(user_id, single_query=True, limits={
+                        'assessments': 0, 'activities': 0, 'stress_logs': 0,
+                        'weight_logs': 0, 'active_challenges': 0
+                    })
                     if not user_data or 'name' not in user_data:
                         st.error("Could not retrieve user data")
                         st.stop()
@@ -55,7 +59,7 @@ if not st.session_state.authenticated:
                     st.session_state.email = login_email
                     st.session_state.username = user_data['name']
                     st.session_state.authenticated = True
-                    st.session_state.chat_history = user_data.get('chat_history', [])
+                    st.session_state.chat_history = get_chat_history(user_id)
                     st.rerun()
                 except Exception as e:
                     st.error(f"Error during login: {str(e)}")
@@ -112,7 +116,11 @@ else:
 
     # Quick status overview using database queries
     try:
-        user_data = get_user_data(st.session_state.user_id)
+        # The overview shows the latest assessment and the activity count
+        user_data = get_user_data(st.session_state.user_id, single_query=True, limits={
+            'assessments': 1, 'activities': 0, 'stress_logs': 0, 'weight_logs': 0,
+            'active_challenges': 0
+        })
         if user_data['assessments']:
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -123,7 +131,7 @@ else:
             with col2:
                 st.metric(
                     label="Activity Streak",
-                    value=f"{len(user_data['activities'])} days"
+                    value=f"{get_activity_count(st.session_state.user_id)} days"
                 )
             with col3:
                 bmi_value = user_data['assessments'][0].get('bmi', 0)
@@ -0,0 +1,195 @@
+"""Local stand-in for the OpenAI chat-completions API, for offline load tests.
+
+Answers POST /v1/chat/completions (streaming and non-streaming) with canned
+wellness text after a configurable delay and at a configurable token rate.
+Only the standard library is used, so it runs in CI without extra packages.
+
+Usage:
+    python -m benchmarks.llm_standin_server --port 8089 --latency-ms 300 --tokens-per-second 60
+    LLM_BACKEND=local streamlit run Home.py
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORDS = (
+    "Taking short movement breaks every hour helps lower stress and keeps your joints mobile. "
+    "Your recent logs show steady progress, so keep building on the habits that work for you. "
+    "Try a five minute stretch for your neck and shoulders between meetings. "
+    "Staying hydrated and getting daylight early in the day can improve both mood and sleep. "
+).split()
+
+
+class StandinConfig:
+    """Behaviour of the stand-in server; every field can be overridden per run."""
+
+    def __init__(self, latency_ms=300.0, tokens_per_second=60.0, completion_tokens=120,
+                 finish_reason="stop", error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.finish_reason = finish_reason
+        # Fraction of requests answered with a 503, to exercise retries
+        self.error_rate = error_rate
+        self._requests = 0
+        self._lock = threading.Lock()
+
+    def should_fail(self):
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            self._requests += 1
+            return (self._requests * self.error_rate) % 1 < self.error_rate
+
+
+def _completion_tokens(config, max_tokens):
+    """Tokens to send and the finish_reason, capped by the request's max_tokens."""
+    count = config.completion_tokens
+    if max_tokens is not None and count >= max_tokens:
+        return [_WORDS[i % len(_WORDS)] + " " for i in range(max_tokens)], "length"
+    return [_WORDS[i % len(_WORDS)] + " " for i in range(count)], config.finish_reason
+
+
+def _prompt_tokens(messages):
+    # Same rough estimate as utils.context_builder, without importing the app
+    return sum(len(str(m.get("content", ""))) // 4 + 4 for m in messages)
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = StandinConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": "standin", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        config = self.config
+
+        time.sleep(config.latency_ms / 1000)
+        if config.should_fail():
+            self._send_json(503, {"error": {"message": "Stand-in server overloaded", "type": "server_error"}})
+            return
+
+        tokens, finish_reason = _completion_tokens(config, request.get("max_tokens"))
+        usage = {
+            "prompt_tokens": _prompt_tokens(request.get("messages", [])),
+            "completion_tokens": len(tokens),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        base = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "created": int(time.time()),
+            "model": request.get("model", "standin"),
+        }
+
+        if request.get("stream"):
+            self._stream(base, tokens, finish_reason, usage, request.get("stream_options") or {})
+        else:
+            time.sleep(len(tokens) / config.tokens_per_second if config.tokens_per_second > 0 else 0)
+            self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": finish_reason,
+                }],
+                "usage": usage,
+            })
+
+    def _stream(self, base, tokens, finish_reason, usage, stream_options):
+        """Send server-sent events, one token per chunk, paced by tokens_per_second."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(choices, extra=None):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": choices, **(extra or {})}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        interval = 1 / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0
+        try:
+            send([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            for token in tokens:
+                time.sleep(interval)
+                send([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+            send([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+            if stream_options.get("include_usage"):
+                send([], {"usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. a cancelled prefetch)
+            pass
+
+
+def start_server(host="127.0.0.1", port=8089, config=None):
+    """Start the stand-in in a daemon thread; returns the server (call shutdown() to stop)."""
+    handler = type("ConfiguredStandinHandler", (StandinHandler,), {"config": config or StandinConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="llm-standin", daemon=True).start()
+    return server
+
+
+def add_config_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--completion-tokens", type=int, default=120,
+                        help="tokens per answer; answers reaching max_tokens end with finish_reason=length")
+    parser.add_argument("--finish-reason", default="stop")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+
+
+def config_from_args(args):
+    return StandinConfig(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        finish_reason=args.finish_reason,
+        error_rate=args.error_rate,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, config_from_args(args))
+    print(f"LLM stand-in listening on http://{args.host}:{args.port}/v1 (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Load-test the assistant's completion path against the local stand-in server.
+
+By default each simulated user streams completions for a fixed prompt through
+utils.llm_client, so the run needs neither a database nor an API key. With
+--user-id the full stream_ai_response path runs (database reads, context
+building, response cache); its replies are saved to that user's chat history.
+
+Usage:
+    python -m benchmarks.load_assistant --start-server --users 16 --requests 20
+    python -m benchmarks.load_assistant --base-url http://127.0.0.1:8089/v1 --users 8
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.llm_standin_server import add_config_arguments, config_from_args, start_server
+from utils.llm_client import get_llm_metrics, set_llm_backend, stream_chat_completion
+
+_PROMPT = [
+    {"role": "system", "content": "You are HealthyRemote, a wellness assistant for a remote worker."},
+    {"role": "user", "content": "How can I reduce my stress during long work days?"},
+]
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def _run_llm_request(max_tokens, n):
+    """Stream one completion; returns (first token seconds, total seconds, tokens)."""
+    start = time.perf_counter()
+    first_token = None
+    tokens = 0
+    for chunk in stream_chat_completion(_PROMPT, max_tokens=max_tokens):
+        if chunk.choices and chunk.choices[0].delta.content:
+            tokens += 1
+            if first_token is None:
+                first_token = time.perf_counter() - start
+    return first_token, time.perf_counter() - start, tokens
+
+
+def _assistant_runner(user_id):
+    from utils.components import stream_ai_response
+
+    def run(max_tokens, n):
+        start = time.perf_counter()
+        first_token = None
+        tokens = 0
+        # A distinct prompt per request keeps the response cache out of the measurement
+        for piece in stream_ai_response(user_id, f"How can I reduce my stress? (load test {n})"):
+            tokens += 1
+            if first_token is None:
+                first_token = time.perf_counter() - start
+        return first_token, time.perf_counter() - start, tokens
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=10, help="requests per user")
+    parser.add_argument("--max-tokens", type=int, default=300)
+    parser.add_argument("--user-id", type=int, help="run the full assistant path for this user")
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint to test")
+    parser.add_argument("--start-server", action="store_true", help="start the stand-in server in-process")
+    parser.add_argument("--port", type=int, default=8089)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if args.start_server:
+        server = start_server(port=args.port, config=config_from_args(args))
+        base_url = f"http://127.0.0.1:{args.port}/v1"
+    set_llm_backend("local", base_url)
+
+    if args.user_id is not None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        run = _assistant_runner(args.user_id)
+    else:
+        run = _run_llm_request
+
+    results = []
+    errors = []
+    lock = threading.Lock()
+
+    def user_session(user_index):
+        for i in range(args.requests):
+            try:
+                result = run(args.max_tokens, user_index * args.requests + i)
+                with lock:
+                    results.append(result)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        list(pool.map(user_session, range(args.users)))
+    elapsed = time.perf_counter() - started
+    if server is not None:
+        server.shutdown()
+
+    first_tokens = [r[0] * 1000 for r in results if r[0] is not None]
+    totals = [r[1] * 1000 for r in results]
+    tokens = sum(r[2] for r in results)
+    print(f"requests: {len(results)} ok, {len(errors)} failed in {elapsed:.2f}s")
+    print(f"throughput: {len(results) / elapsed:.2f} req/s, {tokens / elapsed:.1f} tokens/s")
+    if results:
+        print(f"time to first token ms: mean {statistics.fmean(first_tokens or [0]):.1f}, "
+              f"p50 {_percentile(first_tokens, 0.5):.1f}, p95 {_percentile(first_tokens, 0.95):.1f}")
+        print(f"total latency ms: mean {statistics.fmean(totals):.1f}, "
+              f"p50 {_percentile(totals, 0.5):.1f}, p95 {_percentile(totals, 0.95):.1f}")
+    if errors:
+        print(f"first error: {errors[0]}")
+    print(f"client metrics: {get_llm_metrics()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Compare plain vs server-side prepared execution of the hot read queries.
+
+Usage:
+    python -m benchmarks.prepared_statements --user-id 1 --iterations 500
+"""
+import argparse
+import statistics
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+from utils.db_pool import get_database_url
+from utils.prepared import PreparingConnection, PLAIN_STATEMENTS, execute_prepared
+
+HOT_READERS = ('get_assessments', 'get_activities', 'get_stress_logs', 'get_chat_history')
+
+
+def _params(name, user_id):
+    return (user_id, 15) if name == 'get_chat_history' else (user_id,)
+
+
+def _time_calls(conn, run, iterations):
+    cur = conn.cursor()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run(cur)
+        cur.fetchall()
+        conn.rollback()
+        timings.append((time.perf_counter() - start) * 1000)
+    cur.close()
+    return timings
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    return {
+        'mean': statistics.fmean(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    load_dotenv()
+    dsn = get_database_url()
+    plain_conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    prepared_conn = psycopg2.connect(
+        dsn, cursor_factory=RealDictCursor, connection_factory=PreparingConnection
+    )
+
+    print(f"{'statement':<20} {'mode':<9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    try:
+        for name in HOT_READERS:
+            params = _params(name, args.user_id)
+            runs = {
+                'plain': (plain_conn, lambda cur: cur.execute(PLAIN_STATEMENTS[name], params)),
+                'prepared': (prepared_conn, lambda cur: execute_prepared(cur, name, params)),
+            }
+            for mode, (conn, run) in runs.items():
+                _time_calls(conn, run, 10)  # warm up (and prepare)
+                stats = _summary(_time_calls(conn, run, args.iterations))
+                print(f"{name:<20} {mode:<9} {stats['mean']:>9.3f} {stats['p50']:>9.3f} {stats['p95']:>9.3f}")
+    finally:
+        plain_conn.close()
+        prepared_conn.close()
+
+
+if __name__ == "__main__":
+    main()
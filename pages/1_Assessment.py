@@ -11,7 +11,7 @@ from utils.recommendations import (
     get_ergonomic_recommendations,
     get_activity_recommendations
 )
-from utils.database import save_assessment, get_assessments
+from utils.database import save_assessment, get_assessments_page
 from utils.components import init_spotify_player, interpret_bmi
 
 init_spotify_player()
@@ -135,10 +135,10 @@ if submitted:
             st.write(f"• {rec}")
 
 # Display previous assessments
-previous_assessments = get_assessments(st.session_state.user_id)
+previous_assessments, _ = get_assessments_page(st.session_state.user_id, limit=5)
 if previous_assessments:
     st.subheader("Previous Assessments")
-    for assessment in previous_assessments[:5]:  # Show last 5 assessments
+    for assessment in previous_assessments:  # Show last 5 assessments
         with st.expander(f"Assessment from {assessment['date'].strftime('%Y-%m-%d %H:%M')}"):
             col1, col2, col3 = st.columns(3)
             with col1:
@@ -1,8 +1,7 @@
 import streamlit as st
-import pandas as pd
 from utils.visualization import (
     create_stress_trend_chart,
-    create_activity_heatmap,
+    create_weekday_hour_heatmap,
     create_weight_trend_chart
 )
 from utils.recommendations import (
@@ -11,18 +10,22 @@ from utils.recommendations import (
     get_activity_recommendations
 )
 from utils.database import (
-    get_stress_logs,
-    get_activities,
-    get_weight_logs,
     save_stress_log,
     save_activity,
     save_weight_log,
-    get_assessments,
-    get_active_challenges,
-    get_db_connection #Added this import
+    get_stress_logs_page,
+    get_activities_page,
+    get_weight_logs_page,
+    update_challenge_progress
 )
+from utils.async_database import fetch_sections_sync
+from utils.rollups import get_activity_weekday_hour
+from utils.heatmap import matrix_from_cells
+from utils.figure_cache import cached_figure
+from utils.trend_stats import add_trend_overlays_incremental
+from utils.downsampling import filter_window, CHART_MAX_POINTS
 from utils.pdf_generator import generate_wellness_report
-import json
+import copy
 from json import JSONEncoder
 
 from utils.components import init_spotify_player, interpret_bmi
@@ -35,21 +38,76 @@ class GetEncoder(JSONEncoder):
 
 Json = GetEncoder()
 
+def select_window(rows, key):
+    """Date range picker for long series; a narrow enough window is drawn at full resolution.
+
+    Returns the (start, end) bounds, or None when the whole series is shown.
+    """
+    if len(rows) <= CHART_MAX_POINTS:
+        return None
+    first, last = rows['date'].iloc[0].date(), rows['date'].iloc[-1].date()
+    picked = st.date_input("Zoom to dates", value=(first, last), min_value=first, max_value=last, key=key)
+    # While a range is being picked only its start is set
+    start, end = (tuple(picked) + (None, None))[:2]
+    days = len(filter_window(rows, start, end))
+    if days > CHART_MAX_POINTS:
+        st.caption(f"{days} days downsampled to {CHART_MAX_POINTS} points; narrow the dates for full detail.")
+    return start, end
+
+OVERLAY_OPTIONS = {
+    "7-day mean": 'mean_7d',
+    "30-day mean": 'mean_30d',
+    "EWMA": 'ewma',
+    "30-day min/max": 'band',
+}
+
+def select_overlays(key):
+    """Overlay picker for a trend chart; returns overlay names in a stable order."""
+    picked = st.multiselect("Overlays", list(OVERLAY_OPTIONS), key=key)
+    return tuple(OVERLAY_OPTIONS[label] for label in OVERLAY_OPTIONS if label in picked)
+
+def trend_frame(frame, series, value, overlays):
+    """The series with overlay columns, recomputing only the days added since the last build."""
+    if not overlays:
+        return frame
+    return add_trend_overlays_incremental(st.session_state.user_id, series, frame, value)
+
 st.title("📈 Progress Tracking")
 
-# Get user data from database
-stress_logs = get_stress_logs(st.session_state.user_id)
-activities = get_activities(st.session_state.user_id)
-weight_logs = get_weight_logs(st.session_state.user_id)
-assessments = get_assessments(st.session_state.user_id)
+# Fetch every section concurrently: the page waits for the slowest query, not the sum.
+# Trend charts read the daily rollups as typed columns (the *_frame sections run the
+# columnar readers in worker threads), so their cost scales with days rather than
+# log entries and no per-row dicts are built
+sections = fetch_sections_sync(st.session_state.user_id, [
+    'activity_weekday_hour', 'latest_assessment', 'active_challenges',
+    'stress_daily_frame', 'weight_daily_frame'
+])
+activity_cells = sections['activity_weekday_hour']
+stress_daily = sections['stress_daily_frame']
+weight_daily = sections['weight_daily_frame']
+# Only the latest assessment is shown on this page
+assessments = sections['latest_assessment']
 
 if assessments:
     # Create tabs for different metrics
     tabs = st.tabs(["Stress Levels", "Physical Activity", "Weight Tracking", "Active Challenges"])
 
     with tabs[0]:
-        if stress_logs:
-            st.plotly_chart(create_stress_trend_chart(stress_logs), use_container_width=True)
+        if not stress_daily.empty:
+            stress_window = select_window(stress_daily, "stress_window")
+            stress_overlays = select_overlays("stress_overlays")
+            # Figures are cached per data version, so reruns that log nothing reuse them.
+            # Overlays are computed on the whole series before the window is cut.
+            fig = cached_figure(
+                st.session_state.user_id, 'stress_trend',
+                lambda: create_stress_trend_chart(
+                    filter_window(trend_frame(stress_daily, 'stress', 'stress_score', stress_overlays),
+                                  *(stress_window or ())),
+                    overlays=stress_overlays
+                ),
+                window=stress_window, overlays=stress_overlays
+            )
+            st.plotly_chart(fig, use_container_width=True)
 
         # Add new stress log
         with st.expander("Log Today's Stress Level"):
@@ -60,11 +118,26 @@ if assessments:
                 st.rerun()
 
     with tabs[1]:
-        if activities:
-            activity_df = pd.DataFrame(activities)
-            activity_df['day_of_week'] = pd.to_datetime(activity_df['date']).dt.day_name()
-            activity_df['time_of_day'] = pd.to_datetime(activity_df['date']).dt.hour
-            st.plotly_chart(create_activity_heatmap(activity_df), use_container_width=True)
+        if activity_cells:
+            col1, col2 = st.columns(2)
+            with col1:
+                heatmap_type = st.selectbox(
+                    "Show activity",
+                    ['All', 'Walking', 'Stretching', 'Exercise', 'Standing'],
+                    key="heatmap_type"
+                )
+            with col2:
+                measure = st.radio("Measure", ['Sessions', 'Minutes'], horizontal=True, key="heatmap_measure")
+            def build_heatmap():
+                # The 7x24 cells are summed in SQL, so this costs the same however much is logged
+                cells = activity_cells
+                if heatmap_type != 'All':
+                    cells = get_activity_weekday_hour(st.session_state.user_id, heatmap_type.lower())
+                return create_weekday_hour_heatmap(matrix_from_cells(cells, measure.lower()), measure)
+
+            fig = cached_figure(st.session_state.user_id, 'activity_heatmap', build_heatmap,
+                                activity_type=heatmap_type, measure=measure)
+            st.plotly_chart(fig, use_container_width=True)
 
         # Log new activity
         with st.expander("Log Activity"):
@@ -87,8 +160,19 @@ if assessments:
                 st.rerun()
 
     with tabs[2]:
-        if weight_logs:
-            st.plotly_chart(create_weight_trend_chart(weight_logs), use_container_width=True)
+        if not weight_daily.empty:
+            weight_window = select_window(weight_daily, "weight_window")
+            weight_overlays = select_overlays("weight_overlays")
+            fig = cached_figure(
+                st.session_state.user_id, 'weight_trend',
+                lambda: create_weight_trend_chart(
+                    filter_window(trend_frame(weight_daily, 'weight', 'weight', weight_overlays),
+                                  *(weight_window or ())),
+                    overlays=weight_overlays
+                ),
+                window=weight_window, overlays=weight_overlays
+            )
+            st.plotly_chart(fig, use_container_width=True)
 
         # Log new weight
         with st.expander("Log Weight"):
@@ -100,12 +184,13 @@ if assessments:
 
     with tabs[3]:
         st.subheader("🎯 Active Challenges")
-        active_challenges = get_active_challenges(st.session_state.user_id)
+        active_challenges = sections['active_challenges']
 
         if active_challenges:
             for challenge in active_challenges:
                 with st.expander(f"🌟 {challenge['challenge_name']}"):
-                    progress = challenge['progress']
+                    # Copy so edits don't leak into the shared read cache before they are saved
+                    progress = copy.deepcopy(challenge['progress'])
                     st.write(f"**Started**: {challenge['start_date'].strftime('%Y-%m-%d')}")
                     st.write(f"**Ends**: {challenge['end_date'].strftime('%Y-%m-%d')}")
                     st.write(f"**Current Day**: {progress['current_day']}")
@@ -122,16 +207,7 @@ if assessments:
                         progress['current_day'] = min(progress['current_day'] + 1, 
                                                     (challenge['end_date'] - challenge['start_date']).days + 1)
                         # Update challenge progress in database
-                        conn = get_db_connection()
-                        cur = conn.cursor()
-                        cur.execute("""
-                            UPDATE challenges 
-                            SET progress = %s 
-                            WHERE id = %s
-                        """, (json.dumps(progress), challenge['id'])) # use json.dumps instead of Json
-                        conn.commit()
-                        cur.close()
-                        conn.close()
+                        update_challenge_progress(challenge['id'], progress)
                         st.rerun()
         else:
             st.info("No active challenges. Start a new challenge in the Education section!")
@@ -145,11 +221,12 @@ if assessments:
         recommendations.extend(get_ergonomic_recommendations(latest_assessment['pain_points']))
         recommendations.extend(get_activity_recommendations(latest_assessment['bmi'], latest_assessment['activity_level']))
 
+        # The report tables list the five most recent entries of each log
         user_data = {
             'assessments': assessments,
-            'stress_logs': stress_logs,
-            'activities': activities,
-            'weight_logs': weight_logs,
+            'stress_logs': get_stress_logs_page(st.session_state.user_id, limit=5)[0],
+            'activities': get_activities_page(st.session_state.user_id, limit=5)[0],
+            'weight_logs': get_weight_logs_page(st.session_state.user_id, limit=5)[0],
             'recommendations': recommendations
         }
 
@@ -1,15 +1,18 @@
 import streamlit as st
-from utils.database import get_user_data, save_chat_message, get_chat_history
-from utils.components import get_ai_response
+import pandas as pd
+from utils.database import get_user_data, get_activity_count, get_chat_history
+from utils.columnar import get_history_frame
+from utils.chat_writer import queue_chat_message
+from utils.components import stream_ai_response
 
-def format_user_metrics(user_data):
+def format_user_metrics(user_data, activity_count=0):
     """Format user metrics and history"""
     # Get latest metrics
     latest_assessment = user_data.get('assessments', [{}])[0]
     metrics = {
         'stress': latest_assessment.get('stress_score', 'Not measured'),
         'bmi': latest_assessment.get('bmi', 'Not measured'),
-        'activity_streak': len(user_data.get('activities', []))
+        'activity_streak': activity_count
     }
     
     # Format challenges list with proper indentation
@@ -31,6 +34,11 @@ def format_user_metrics(user_data):
     
     return metrics, historical_data, "\n\n".join(challenges_text)  # Add extra newline for separation
 
+# The greeting and challenge list need the latest assessment and the challenges only
+GREETING_LIMITS = {
+    'assessments': 1, 'activities': 0, 'stress_logs': 0, 'weight_logs': 0
+}
+
 # Page configuration
 st.set_page_config(page_title="AI Wellness Assistant", page_icon="💬", layout="wide")
 
@@ -53,50 +61,47 @@ with col2:
         ["Weight History", "Stress History", "Activity History", "Active Challenges"]
     )
 
-    user_data = get_user_data(st.session_state.user_id)
-    metrics, historical_data, challenges = format_user_metrics(user_data)
-
-    # Display selected record type
+    # Histories are read as typed columns and formatted column-wise, not row by row
     if records_option == "Weight History":
-        if historical_data['weight_logs']:
+        weights = get_history_frame(st.session_state.user_id, 'weight_logs')
+        if not weights.empty:
             st.markdown("### ⚖️ Weight History")
             st.dataframe(
-                [{"Date": w['date'].strftime('%Y-%m-%d'), 
-                  "Weight (kg)": w['weight']} 
-                 for w in historical_data['weight_logs']],
+                pd.DataFrame({"Date": weights['date'].dt.strftime('%Y-%m-%d'),
+                              "Weight (kg)": weights['weight']}),
                 hide_index=True
             )
         else:
             st.info("No weight records found.")
             
     elif records_option == "Stress History":
-        if historical_data['stress_logs']:
+        stress = get_history_frame(st.session_state.user_id, 'stress_logs')
+        if not stress.empty:
             st.markdown("### 😌 Stress History")
             st.dataframe(
-                [{"Date": s['date'].strftime('%Y-%m-%d'), 
-                  "Stress Level": f"{s['stress_score']}/10"} 
-                 for s in historical_data['stress_logs']],
+                pd.DataFrame({"Date": stress['date'].dt.strftime('%Y-%m-%d'),
+                              "Stress Level": stress['stress_score'].astype('string') + "/10"}),
                 hide_index=True
             )
         else:
             st.info("No stress records found.")
             
     elif records_option == "Activity History":
-        if historical_data['activities']:
+        activities = get_history_frame(st.session_state.user_id, 'activities')
+        if not activities.empty:
             st.markdown("### 🏃‍♂️ Activity History")
             st.dataframe(
-                [{"Date": a['date'].strftime('%Y-%m-%d'),
-                  "Activity": a['activity_type'],  # Changed from 'type' to 'activity_type'
-                  "Duration": f"{a['duration']} min"} 
-                 for a in historical_data['activities']],
+                pd.DataFrame({"Date": activities['date'].dt.strftime('%Y-%m-%d'),
+                              "Activity": activities['activity_type'],
+                              "Duration": activities['duration'].astype('string') + " min"}),
                 hide_index=True
             )
         else:
             st.info("No activity records found.")
             
     elif records_option == "Active Challenges":
-        # Re-fetch user data and formatted challenges
-        user_data = get_user_data(st.session_state.user_id)
+        # Challenges come with the user profile; the log sections are not needed here
+        user_data = get_user_data(st.session_state.user_id, single_query=True, limits=GREETING_LIMITS)
         metrics, historical_data, challenges_formatted = format_user_metrics(user_data)
 
         if challenges_formatted.strip():  # Ensure it's not empty
@@ -110,9 +115,11 @@ with col1:
     if "messages" not in st.session_state:
         try:
             # Get user data
-            user_data = get_user_data(st.session_state.user_id)
+            user_data = get_user_data(st.session_state.user_id, single_query=True, limits=GREETING_LIMITS)
             username = user_data['name']
-            metrics, historical_data, challenges_formatted = format_user_metrics(user_data)
+            metrics, historical_data, challenges_formatted = format_user_metrics(
+                user_data, get_activity_count(st.session_state.user_id)
+            )
 
             # Create initial greeting with properly formatted challenges
             initial_greeting = f"""Hello {username}! 👋
@@ -149,32 +156,11 @@ Your current wellness metrics:
         with st.chat_message("user"):
             st.markdown(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
-        save_chat_message(st.session_state.user_id, "user", prompt)
+        queue_chat_message(st.session_state.user_id, "user", prompt)
 
         with st.chat_message("assistant"):
-            # Check if it's a records request
-            if any(keyword in prompt.lower() for keyword in ["show records", "show history", "weight history", "stress history"]):
-                # Get fresh data
-                user_data = get_user_data(st.session_state.user_id)
-                metrics, historical_data, challenges = format_user_metrics(user_data)
-                
-                if "weight" in prompt.lower():
-                    response = """Here are your weight records:
-                    ```markdown
-                    | Date | Weight (kg) |
-                    |------|------------|
-                    {}
-                    ```
-                    """.format('\n'.join([
-                        f"|{w['date'].strftime('%Y-%m-%d')}|{w['weight']}|" 
-                        for w in historical_data['weight_logs']
-                    ]))
-                else:
-                    # Let AI handle other responses
-                    response = get_ai_response(st.session_state.user_id, prompt)
-            else:
-                response = get_ai_response(st.session_state.user_id, prompt)
-                
-            st.markdown(response)
+            # Records requests are answered locally and everything else is streamed
+            # from the model; the full reply is saved when the stream ends
+            response = st.write_stream(stream_ai_response(st.session_state.user_id, prompt))
         st.session_state.messages.append({"role": "assistant", "content": response})
 
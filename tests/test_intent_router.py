@@ -0,0 +1,56 @@
+import pytest
+
+from utils.intent_router import (
+    match_intents, local_records_intents, CONTINUATION, SPANISH, ALL_RECORDS, WEIGHT_RECORDS,
+    STRESS_RECORDS, ACTIVITY_RECORDS, ASSESSMENT_RECORDS, MOBILITY_RECORDS, CHALLENGE_RECORDS,
+)
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("show my stress history", {STRESS_RECORDS}),
+    ("Show me my weight log", {WEIGHT_RECORDS}),
+    ("list my activities", {ACTIVITY_RECORDS}),
+    ("display my assessments", {ASSESSMENT_RECORDS}),
+    ("can you list my mobility tests", {MOBILITY_RECORDS}),
+    ("pull up my active challenges", {CHALLENGE_RECORDS}),
+    ("show my stress history and weight history", {STRESS_RECORDS, WEIGHT_RECORDS}),
+    ("please show my records", {ALL_RECORDS}),
+    ("show me all my data", {ALL_RECORDS}),
+    ("my stress history", {STRESS_RECORDS}),
+    ("stress history", {STRESS_RECORDS}),
+    ("my assessments", {ASSESSMENT_RECORDS}),
+    ("my logs", {ALL_RECORDS}),
+    ("weight log please", {WEIGHT_RECORDS}),
+    ("stress history and weight history", {STRESS_RECORDS, WEIGHT_RECORDS}),
+])
+def test_routed_to_local_tables(message, expected):
+    assert set(local_records_intents(match_intents(message))) == expected
+
+
+@pytest.mark.parametrize("message", [
+    "I'm worried about my stress levels lately",
+    "my weight is going up, is that bad?",
+    "I feel tired, my stress log says 8 every day",
+    "my history of back pain",
+    "my stress history?",
+    "I walked today, add it to my activities",
+    "stress history makes me anxious",
+    "show my weight history?",
+    "show me how to improve my stress levels",
+    "can you show my stress log trend",
+    "show my health journey",
+    "show me some stretches",
+    "continue",
+    "hello",
+])
+def test_sent_to_model(message):
+    assert local_records_intents(match_intents(message)) == ()
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("continue", CONTINUATION),
+    ("  more ", CONTINUATION),
+    ("hola, como estas", SPANISH),
+])
+def test_other_intents(message, intent):
+    assert intent in match_intents(message)
@@ -0,0 +1,83 @@
+import types
+
+import pytest
+
+components = pytest.importorskip("utils.components")
+
+from utils.cache import invalidate_user, DATA
+from utils.response_cache import clear_response_cache, response_cache_key
+
+
+def _chunk(text, finish_reason=None):
+    choice = types.SimpleNamespace(delta=types.SimpleNamespace(content=text), finish_reason=finish_reason)
+    return types.SimpleNamespace(choices=[choice])
+
+
+class _FakeStream:
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    """Run the assistant against an in-memory chat and a fake model; returns the model calls."""
+    calls = []
+    turns = []
+
+    def fake_stream(messages, max_tokens=None):
+        calls.append(messages)
+        return _FakeStream([_chunk("Take a short walk between meetings."), _chunk(None, "stop")])
+
+    def queue(user_id, role, content):
+        turns.append({'role': role, 'content': content})
+
+    monkeypatch.setattr(components, "stream_chat_completion", fake_stream)
+    monkeypatch.setattr(components, "queue_chat_message", queue)
+    monkeypatch.setattr(components, "get_conversation_memory", lambda user_id: {'summary': "", 'turns': list(turns)})
+    monkeypatch.setattr(components, "retrieve_snippets", lambda *args, **kwargs: [])
+    monkeypatch.setattr(components, "get_user_data", lambda *args, **kwargs: {'name': "Test"})
+    monkeypatch.setattr(components, "get_history_totals", lambda user_id: {})
+    monkeypatch.setattr(components, "schedule_summary_update", lambda user_id: None)
+    monkeypatch.setattr(components, "prepare_continuation", lambda *args, **kwargs: ("", None))
+    clear_response_cache()
+    yield calls
+    clear_response_cache()
+
+
+def _ask(user_id, message):
+    # The assistant page queues the prompt before streaming the answer
+    components.queue_chat_message(user_id, "user", message)
+    return "".join(components.stream_ai_response(user_id, message))
+
+
+def test_repeated_question_calls_the_model_once(model_calls):
+    first = _ask(101, "How can I lower my stress at work?")
+    second = _ask(101, "how can I lower my stress at work")
+    assert second == first
+    assert len(model_calls) == 1
+
+
+def test_new_data_invalidates_the_answer(model_calls):
+    _ask(102, "How can I lower my stress at work?")
+    invalidate_user(102, (DATA,))
+    _ask(102, "How can I lower my stress at work?")
+    assert len(model_calls) == 2
+
+
+def test_short_follow_ups_are_not_cached(model_calls):
+    _ask(103, "why?")
+    _ask(103, "why?")
+    assert len(model_calls) == 2
+    assert response_cache_key(103, "why?") is None
+
+
+def test_summary_change_misses():
+    question = "How can I lower my stress at work?"
+    assert response_cache_key(104, question, "") == response_cache_key(104, question, "")
+    assert response_cache_key(104, question, "") != response_cache_key(104, question, "Talked about sleep.")
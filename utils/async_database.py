@@ -0,0 +1,163 @@
+import asyncio
+import calendar
+import json
+import os
+import threading
+import time
+
+import asyncpg
+
+from .db_pool import get_database_url
+from .cache import make_key, cache_get, cache_set, DATA
+from .db_metrics import record_acquire, record_call
+from .columnar import get_stress_daily_frame, get_weight_daily_frame
+
+ASYNC_POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN_SIZE", "1"))
+ASYNC_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", "10"))
+ASYNC_FETCH_TIMEOUT = float(os.getenv("ASYNC_DB_FETCH_TIMEOUT", "30"))
+
+
+def _add_day_names(rows):
+    for row in rows:
+        row['day_of_week'] = calendar.day_name[row['weekday']]
+        row['time_of_day'] = row['hour']
+    return rows
+
+
+# Section name -> (SQL, name of the matching sync reader or None, post-processing).
+# Sections that mirror a sync reader return the same rows and share its cache entries.
+SECTIONS = {
+    'assessments': ("""
+        SELECT * FROM assessments WHERE user_id = $1 ORDER BY date DESC
+    """, 'get_assessments', None),
+    'latest_assessment': ("""
+        SELECT * FROM assessments WHERE user_id = $1 ORDER BY date DESC, id DESC LIMIT 1
+    """, None, None),
+    'activities': ("""
+        SELECT * FROM activities WHERE user_id = $1 ORDER BY date DESC
+    """, 'get_activities', None),
+    'stress_logs': ("""
+        SELECT * FROM stress_logs WHERE user_id = $1 ORDER BY date DESC
+    """, 'get_stress_logs', None),
+    'weight_logs': ("""
+        SELECT * FROM weight_logs WHERE user_id = $1 ORDER BY date DESC
+    """, 'get_weight_logs', None),
+    'mobility_tests': ("""
+        SELECT * FROM mobility_tests WHERE user_id = $1 ORDER BY date DESC
+    """, 'get_mobility_tests', None),
+    'active_challenges': ("""
+        SELECT * FROM challenges WHERE user_id = $1 AND status = 'active' ORDER BY start_date DESC
+    """, 'get_active_challenges', None),
+    'stress_daily': ("""
+        SELECT day AS date, score_sum::float / entries AS stress_score,
+               score_min AS stress_min, score_max AS stress_max, entries
+        FROM stress_daily WHERE user_id = $1 ORDER BY day
+    """, 'get_stress_daily', None),
+    'weight_daily': ("""
+        SELECT day AS date, weight, entries
+        FROM weight_daily WHERE user_id = $1 ORDER BY day
+    """, 'get_weight_daily', None),
+    'activity_weekday_hour': ("""
+        SELECT (EXTRACT(ISODOW FROM day)::int - 1) AS weekday, hour,
+               SUM(minutes) AS minutes, SUM(sessions) AS sessions
+        FROM activity_hourly WHERE user_id = $1
+        GROUP BY 1, 2 ORDER BY 1, 2
+    """, 'get_activity_weekday_hour', _add_day_names),
+}
+
+# Section name -> sync reader with no asyncpg equivalent (the COPY-based
+# DataFrame readers); it runs in a worker thread within the same gather.
+THREAD_SECTIONS = {
+    'stress_daily_frame': get_stress_daily_frame,
+    'weight_daily_frame': get_weight_daily_frame,
+}
+
+# The async pool lives on one background event loop shared by the whole process,
+# so Streamlit's synchronous script threads can submit coroutines to it.
+_loop = None
+_loop_lock = threading.Lock()
+_pool = None
+_pool_lock = None
+
+
+async def _init_connection(conn):
+    """Decode json/jsonb columns the same way psycopg2 does."""
+    for type_name in ('json', 'jsonb'):
+        await conn.set_type_codec(
+            type_name, encoder=json.dumps, decoder=json.loads, schema='pg_catalog'
+        )
+
+
+async def get_async_pool():
+    """Return the process-wide asyncpg pool, creating it on first use."""
+    global _pool, _pool_lock
+    if _pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    get_database_url(),
+                    min_size=ASYNC_POOL_MIN_SIZE,
+                    max_size=ASYNC_POOL_MAX_SIZE,
+                    init=_init_connection
+                )
+    return _pool
+
+
+async def fetch_section(user_id, section):
+    """Fetch one section of a user's data as a list of dicts (a DataFrame for THREAD_SECTIONS)."""
+    if section in THREAD_SECTIONS:
+        return await asyncio.get_running_loop().run_in_executor(None, THREAD_SECTIONS[section], user_id)
+    sql, reader_name, postprocess = SECTIONS[section]
+    key = make_key(reader_name or f"async:{section}", user_id, (DATA,))
+    found, rows = cache_get(key)
+    if found:
+        return rows
+
+    pool = await get_async_pool()
+    start = time.perf_counter()
+    async with pool.acquire() as conn:
+        acquired = time.perf_counter()
+        record_acquire(acquired - start)
+        try:
+            records = await conn.fetch(sql, user_id)
+        except Exception:
+            record_call(f"async:{section}", time.perf_counter() - acquired, error=True)
+            raise
+    record_call(f"async:{section}", time.perf_counter() - acquired, len(records))
+    rows = [dict(record) for record in records]
+    if postprocess:
+        rows = postprocess(rows)
+    cache_set(key, rows)
+    return rows
+
+
+async def fetch_sections(user_id, sections):
+    """Fetch several sections concurrently; returns {section: rows}."""
+    results = await asyncio.gather(*(fetch_section(user_id, section) for section in sections))
+    return dict(zip(sections, results))
+
+
+def _get_loop():
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="async-db-loop", daemon=True
+                ).start()
+                _loop = loop
+    return _loop
+
+
+def run_async(coro, timeout=ASYNC_FETCH_TIMEOUT):
+    """Run a coroutine on the shared background loop and wait for its result."""
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    return future.result(timeout)
+
+
+def fetch_sections_sync(user_id, sections, timeout=ASYNC_FETCH_TIMEOUT):
+    """Blocking wrapper around fetch_sections for Streamlit pages."""
+    return run_async(fetch_sections(user_id, list(sections)), timeout)
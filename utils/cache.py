@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", "300"))
+READ_CACHE_MAX_ENTRIES = int(os.getenv("READ_CACHE_MAX_ENTRIES", "1024"))
+
+# Invalidation scopes: health data (logs, assessments, challenges) and chat messages
+DATA = 'data'
+CHAT = 'chat'
+ALL_SCOPES = (DATA, CHAT)
+
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters.
+
+    With `max_bytes` set, values must support len() (e.g. serialized str or
+    bytes) and the oldest entries are also evicted to stay under that size.
+    """
+
+    def __init__(self, max_entries=READ_CACHE_MAX_ENTRIES, ttl=READ_CACHE_TTL, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'invalidated': 0}
+
+    def _pop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        """Return (found, value) and refresh the entry's LRU position."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+            value, expires_at, _ = entry
+            if expires_at < time.monotonic():
+                self._pop(key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, value
+
+    def set(self, key, value):
+        size = len(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # would evict everything else and still not fit
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._pop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def discard_where(self, predicate):
+        """Drop every entry whose key matches the predicate."""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                self._pop(key)
+            self._stats['invalidated'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['entries'] = len(self._entries)
+            if self.max_bytes is not None:
+                snapshot['bytes'] = self._bytes
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = snapshot['hits'] / lookups if lookups else 0.0
+        return snapshot
+
+
+_read_cache = LRUCache()
+_versions = {}
+_versions_lock = threading.Lock()
+_listeners = []
+
+
+def get_user_version(user_id, scopes=ALL_SCOPES):
+    """Return the current version tuple of a user's data for the given scopes."""
+    return tuple(_versions.get((user_id, scope), 0) for scope in scopes)
+
+
+def invalidate_user(user_id, scopes=(DATA,)):
+    """Bump a user's version after a write and drop their cached reads."""
+    with _versions_lock:
+        for scope in scopes:
+            _versions[(user_id, scope)] = _versions.get((user_id, scope), 0) + 1
+    _read_cache.discard_where(
+        lambda key: key[1] == user_id and any(scope in key[2] for scope in scopes)
+    )
+    for listener in _listeners:
+        listener(user_id, scopes)
+
+
+def add_invalidation_listener(listener):
+    """Register a callback(user_id, scopes) run after every invalidation."""
+    _listeners.append(listener)
+
+
+def _freeze(value):
+    """Make dict/list arguments hashable so they can be part of a cache key."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def make_key(name, user_id, scopes, args=(), kwargs=None):
+    """Build the cache key of a reader call; the version makes stale keys unreachable."""
+    return (
+        name, user_id, scopes, get_user_version(user_id, scopes),
+        _freeze(list(args)), _freeze(kwargs or {})
+    )
+
+
+def cache_get(key):
+    """Look up a key built with make_key(); returns (found, value)."""
+    return _read_cache.get(key)
+
+
+def cache_set(key, value):
+    _read_cache.set(key, value)
+
+
+def cached_reader(*scopes):
+    """Cache a `func(user_id, ...)` reader, keyed by user, version and arguments.
+
+    Cached results are shared between callers and must be treated as read-only.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(user_id, *args, **kwargs):
+            key = make_key(func.__name__, user_id, scopes, args, kwargs)
+            found, value = _read_cache.get(key)
+            if found:
+                return value
+            value = func(user_id, *args, **kwargs)
+            _read_cache.set(key, value)
+            return value
+        return wrapper
+    return decorator
+
+
+def get_cache_stats():
+    """Return hit/miss counters of the read-through cache."""
+    return _read_cache.stats()
+
+
+def clear_cache():
+    _read_cache.clear()
@@ -0,0 +1,235 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+from .db_pool import get_connection
+from .db_metrics import logger, record_call
+from .cache import invalidate_user, CHAT
+
+# Set CHAT_WRITE_BEHIND=0 to insert chat messages synchronously
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "1") != "0"
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "100"))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "0.5"))
+# Backpressure: when the queue is full, callers wait this long, then write inline
+CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", "10000"))
+CHAT_WRITE_ENQUEUE_TIMEOUT = float(os.getenv("CHAT_WRITE_ENQUEUE_TIMEOUT", "1"))
+CHAT_WRITE_RETRIES = 3
+
+# Each row is stamped with its age at insert time, so messages keep the time
+# (and order) they were queued at even when a batch lands in one transaction
+_INSERT_SQL = "INSERT INTO chat_history (user_id, role, content, timestamp) VALUES %s"
+_INSERT_TEMPLATE = "(%s, %s, %s, LOCALTIMESTAMP - make_interval(secs => %s))"
+
+_FLUSH = object()
+_STOP = object()
+
+_message_listeners = []
+
+
+def add_message_listener(listener):
+    """Register a callback(user_id, role, content) run for every queued message."""
+    _message_listeners.append(listener)
+
+
+def _insert_messages(messages):
+    """Insert (user_id, role, content, queued_at) tuples in one transaction."""
+    start = time.perf_counter()
+    now = time.monotonic()
+    rows = [(user_id, role, content, max(now - queued_at, 0.0)) for user_id, role, content, queued_at in messages]
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(cur, _INSERT_SQL, rows, template=_INSERT_TEMPLATE, page_size=len(rows))
+            conn.commit()
+    except Exception:
+        record_call("chat_write_batch", time.perf_counter() - start, len(rows), error=True)
+        raise
+    record_call("chat_write_batch", time.perf_counter() - start, len(rows))
+
+
+class ChatWriteBehind:
+    """Background writer that persists chat messages in micro-batches.
+
+    A batch is written when it reaches `batch_size`, when `flush_interval`
+    seconds have passed since its first message, when a reader asks for a
+    flush, and at shutdown.
+    """
+
+    def __init__(self, batch_size=CHAT_WRITE_BATCH_SIZE, flush_interval=CHAT_WRITE_FLUSH_INTERVAL,
+                 queue_size=CHAT_WRITE_QUEUE_SIZE, enqueue_timeout=CHAT_WRITE_ENQUEUE_TIMEOUT):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        # Messages queued but not yet committed, per user, oldest first, so readers
+        # can wait for them or read them from memory
+        self._pending = {}
+        self._pending_changed = threading.Condition()
+        self._stats = {'queued': 0, 'written': 0, 'batches': 0, 'inline_writes': 0, 'dropped': 0}
+        self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, user_id, role, content):
+        message = (user_id, role, content, time.monotonic())
+        with self._pending_changed:
+            self._pending.setdefault(user_id, []).append(message)
+            self._stats['queued'] += 1
+        try:
+            self._queue.put(message, timeout=self.enqueue_timeout)
+        except queue.Full:
+            # The writer is falling behind: slow this caller down instead of dropping the message
+            logger.warning("Chat write queue is full; writing message inline")
+            try:
+                _insert_messages([message])
+                self._stats['inline_writes'] += 1
+            finally:
+                self._done([message])
+        # Readers of the chat scope miss the cache and wait for the pending rows
+        invalidate_user(user_id, (CHAT,))
+
+    def _done(self, messages):
+        with self._pending_changed:
+            for message in messages:
+                user_id = message[0]
+                pending = [m for m in self._pending.get(user_id, ()) if m is not message]
+                if pending:
+                    self._pending[user_id] = pending
+                else:
+                    self._pending.pop(user_id, None)
+            self._pending_changed.notify_all()
+        # Reads cached while the rows were in flight do not include them
+        for user_id in {message[0] for message in messages}:
+            invalidate_user(user_id, (CHAT,))
+
+    def pending_messages(self, user_id):
+        """(role, content) of the user's messages not committed yet, oldest first."""
+        with self._pending_changed:
+            return [(role, content) for _, role, content, _ in self._pending.get(user_id, ())]
+
+    def _write(self, batch):
+        for attempt in range(CHAT_WRITE_RETRIES):
+            try:
+                _insert_messages(batch)
+                self._stats['written'] += len(batch)
+                self._stats['batches'] += 1
+                break
+            except Exception:
+                logger.exception("Failed to write %d chat messages (attempt %d)", len(batch), attempt + 1)
+                time.sleep(0.5 * 2 ** attempt)
+        else:
+            self._stats['dropped'] += len(batch)
+        self._done(batch)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if item is _FLUSH:
+                continue
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _FLUSH:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def wait_for(self, user_id=None, timeout=5.0):
+        """Flush now and block until the user's (or everyone's) queued messages are committed."""
+        def settled():
+            return not self._pending if user_id is None else user_id not in self._pending
+
+        with self._pending_changed:
+            if settled():
+                return True
+        try:
+            self._queue.put_nowait(_FLUSH)
+        except queue.Full:
+            pass  # a full queue is flushed as fast as the writer can go anyway
+        with self._pending_changed:
+            return self._pending_changed.wait_for(settled, timeout)
+
+    def close(self, timeout=10.0):
+        """Write everything still queued and stop the writer thread."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._pending_changed:
+            snapshot = dict(self._stats)
+            snapshot['pending'] = sum(len(messages) for messages in self._pending.values())
+        snapshot['queue_depth'] = self._queue.qsize()
+        return snapshot
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_chat_writer():
+    """Return the process-wide write-behind writer, starting it on first use."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ChatWriteBehind()
+                atexit.register(_writer.close)
+    return _writer
+
+
+def queue_chat_message(user_id, role, content):
+    """Persist a chat message without waiting for the database."""
+    if CHAT_WRITE_BEHIND:
+        get_chat_writer().enqueue(user_id, role, content)
+    else:
+        _insert_messages([(user_id, role, content, time.monotonic())])
+        invalidate_user(user_id, (CHAT,))
+    for listener in _message_listeners:
+        try:
+            listener(user_id, role, content)
+        except Exception:
+            logger.exception("Chat message listener failed")
+
+
+def flush_chat_writes(user_id=None, timeout=5.0):
+    """Make queued messages visible to readers; cheap when nothing is pending."""
+    if _writer is None:
+        return True
+    return _writer.wait_for(user_id, timeout)
+
+
+def pending_chat_messages(user_id):
+    """(role, content) of the user's queued messages not in the database yet, oldest first.
+
+    Lets readers on the request path merge them in instead of waiting for a flush.
+    """
+    if _writer is None:
+        return []
+    return _writer.pending_messages(user_id)
+
+
+def get_chat_writer_stats():
+    return _writer.stats() if _writer is not None else {}
+
+
+def close_chat_writer():
+    if _writer is not None:
+        _writer.close()
@@ -0,0 +1,113 @@
+import io
+
+import pandas as pd
+from psycopg2.extensions import encodings
+
+from .db_pool import get_connection
+from .db_metrics import instrumented
+from .cache import cached_reader, DATA
+from .rollups import STRESS_DAILY_SQL, WEIGHT_DAILY_SQL
+
+# Column -> pandas dtype for everything the columnar readers fetch. Nullable
+# integer types keep NULLs without falling back to float or object columns.
+COLUMN_TYPES = {
+    'id': 'int64',
+    'user_id': 'int32',
+    'stress_score': 'Int16',
+    'stress_min': 'Int16',
+    'stress_max': 'Int16',
+    'entries': 'int32',
+    'weight': 'float64',
+    'bmi': 'float64',
+    'physical_score': 'Int16',
+    'duration': 'Int32',
+    'activity_type': 'category',
+    'activity_level': 'category',
+    'test_name': 'category',
+    'score': 'string',
+    'notes': 'string',
+}
+DATE_COLUMNS = ('date', 'start_date', 'end_date', 'timestamp')
+# Written for NULL by COPY so empty strings stay distinguishable; a value equal
+# to the marker would be quoted by COPY but still read back as NULL.
+NULL_MARKER = r'\N'
+
+# Columns each history table exposes to the columnar reader
+HISTORY_FRAME_COLUMNS = {
+    'assessments': ('date', 'stress_score', 'bmi', 'activity_level', 'physical_score'),
+    'activities': ('date', 'activity_type', 'duration'),
+    'stress_logs': ('date', 'stress_score'),
+    'weight_logs': ('date', 'weight'),
+    'mobility_tests': ('date', 'test_name', 'score', 'notes'),
+}
+
+
+def fetch_frame(query, params=None, dtypes=None):
+    """Run a query and load the result into a typed DataFrame.
+
+    The result is streamed with COPY ... TO STDOUT as CSV and parsed by
+    pandas' C reader straight into column arrays, so no per-row tuples or
+    dicts are built. Parameters are bound client-side since COPY does not
+    accept them. Column types come from COLUMN_TYPES unless `dtypes` overrides
+    them; date columns are parsed as datetime64. NULLs come back as missing
+    values and empty strings as ''; dates are written in ISO format whatever
+    the server's DateStyle.
+    """
+    buffer = io.BytesIO()
+    with get_connection() as conn:
+        encoding = encodings[conn.encoding]
+        cur = conn.cursor()
+        sql = cur.mogrify(query, params).decode(encoding)
+        # Reset when the pool rolls the transaction back on release
+        cur.execute("SET LOCAL DateStyle TO 'ISO, YMD'")
+        cur.copy_expert(
+            f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '{NULL_MARKER}')", buffer
+        )
+        cur.close()
+    buffer.seek(0)
+
+    header = buffer.readline().decode(encoding).rstrip('\r\n').split(',')
+    buffer.seek(0)
+    types = dict(COLUMN_TYPES, **(dtypes or {}))
+    return pd.read_csv(
+        buffer,
+        encoding=encoding,
+        dtype={column: types[column] for column in header if column in types},
+        parse_dates=[column for column in header if column in DATE_COLUMNS],
+        date_format='ISO8601',
+        keep_default_na=False,
+        na_values=[NULL_MARKER],
+    )
+
+
+@cached_reader(DATA)
+@instrumented
+def get_history_frame(user_id, table, since=None, until=None):
+    """A user's whole history of one table as a DataFrame, newest first.
+
+    `since` (inclusive) and `until` (exclusive) bound the date window, as in
+    the paginated readers. Cached frames are shared and must not be modified.
+    """
+    if table not in HISTORY_FRAME_COLUMNS:
+        raise ValueError(f"Unknown history table: {table}")
+    return fetch_frame(f"""
+        SELECT {', '.join(HISTORY_FRAME_COLUMNS[table])} FROM {table}
+        WHERE user_id = %(user_id)s
+          AND (%(since)s::timestamp IS NULL OR date >= %(since)s)
+          AND (%(until)s::timestamp IS NULL OR date < %(until)s)
+        ORDER BY date DESC, id DESC
+    """, {'user_id': user_id, 'since': since, 'until': until})
+
+
+@cached_reader(DATA)
+@instrumented
+def get_stress_daily_frame(user_id, since=None):
+    """Daily stress mean/min/max as a DataFrame, oldest first."""
+    return fetch_frame(STRESS_DAILY_SQL, {'user_id': user_id, 'since': since}, {'stress_score': 'float64'})
+
+
+@cached_reader(DATA)
+@instrumented
+def get_weight_daily_frame(user_id, since=None):
+    """Last logged weight of each day as a DataFrame, oldest first."""
+    return fetch_frame(WEIGHT_DAILY_SQL, {'user_id': user_id, 'since': since})
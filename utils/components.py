@@ -1,8 +1,23 @@
 import streamlit as st
-from typing import List, Dict
-from openai import OpenAI
-from .database import save_chat_message, get_chat_history, get_user_data
+from typing import List, Dict, Iterator
+from .database import (get_chat_history, get_user_data, get_active_challenges,
+                       get_assessments_page, get_activities_page, get_stress_logs_page,
+                       get_weight_logs_page, get_mobility_tests_page)
+from .intent_router import (match_intents, local_records_intents, CONTINUATION, DATA_INTENTS,
+                            HEALTH_JOURNEY, SPANISH, WEIGHT_RECORDS, STRESS_RECORDS, ACTIVITY_RECORDS,
+                            ASSESSMENT_RECORDS, MOBILITY_RECORDS, CHALLENGE_RECORDS, ALL_RECORDS, RECORDS_INTENTS)
+from .context_builder import build_user_context, truncate_to_tokens, CONTEXT_ROW_LIMITS
+from .rollups import get_history_totals
+from .chat_writer import queue_chat_message
+from .conversation_memory import get_conversation_memory, schedule_summary_update, MEMORY_TURN_TOKENS
+from .llm_client import stream_chat_completion
+from .retrieval import retrieve_snippets
+from .response_cache import response_cache_key, get_cached_response, cache_response
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 
 def init_spotify_player():
     """Initialize Spotify player in sidebar"""
@@ -45,57 +60,115 @@ def init_spotify_player():
         </iframe>
     """, unsafe_allow_html=True)
 
-def get_ai_response(user_id: int, user_message: str, previous_response: str = "") -> str:
-    """Generate AI response to user message with context awareness"""
-    try:
-        client = OpenAI()
-        
-        # Get comprehensive user data
-        user_data = get_user_data(user_id)
-        
-        # Check if this is a continuation request
-        is_continuation_request = ("continue" in user_message.lower() or 
-                                  user_message.lower() in ["more", "go on", "what's next", "proceed", "continuar"])
-                                  
-        # If it's a continuation and we have stored content, return that
-        if is_continuation_request and "remaining_response" in st.session_state:
-            formatted_response = st.session_state.remaining_response
-            del st.session_state.remaining_response
-            return formatted_response
-            
-        # Create conversation context from chat history
-        conversation_history = user_data.get('chat_history', [])
-        # Take only the last 15 messages to avoid token limits
-        recent_history = conversation_history[-15:] if len(conversation_history) > 15 else conversation_history
-        
-        # Check if user is asking about "my story" or "my health journey"
-        is_asking_about_health_journey = any(phrase in user_message.lower() for phrase in 
-            ["my journey", "my health journey", "my progress", "my health progress", "my data story"])
-        
-        # Get BMI value and interpretation
-        bmi_value = user_data['assessments'][0]['bmi'] if user_data['assessments'] else 'No data'
-        bmi_category = interpret_bmi(bmi_value) if bmi_value != 'No data' else 'No data'
-        
-        # Add comprehensive assessment history
-        assessment_history = "\n".join([
-            f"- Date: {a['date'].strftime('%Y-%m-%d')}, Stress Score: {a.get('stress_score', 'N/A')}, " + 
-            f"BMI: {a.get('bmi', 'N/A')} ({interpret_bmi(a.get('bmi', 'N/A'))})"
-            for a in user_data['assessments']
-        ])
-        
-        # Build system message with user data context
-        system_content = f"""You are HealthyRemote, a wellness assistant for {user_data['name']}. 
-You have access to their complete health records, previous conversation context, and previous assessments:
-
-1. Weight History: {[f"{w['date'].strftime('%Y-%m-%d')}: {w['weight']}kg" for w in user_data['weight_logs']]}
-2. Latest Assessment:
-   - Stress Score: {user_data['assessments'][0]['stress_score'] if user_data['assessments'] else 'No data'}
-   - BMI: {bmi_value} ({bmi_category})
-3. Assessment History:
-{assessment_history}
-4. Activity History: {len(user_data['activities'])} activities recorded
-5. Stress History: {[f"{s['date'].strftime('%Y-%m-%d')}: {s['stress_score']}/10" for s in user_data['stress_logs']]}
-6. Active Challenges: {[c['challenge_name'] for c in user_data['active_challenges']]}
+# Rows shown per table when records are answered locally
+RECORDS_ANSWER_LIMIT = 20
+
+def _markdown_table(headers, rows):
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    lines += ["| " + " | ".join(str(value) for value in row) + " |" for row in rows]
+    return "\n".join(lines)
+
+def _records_section(title, page, headers, format_row, limit):
+    rows, next_cursor = page
+    if not rows:
+        return f"### {title}\nNo records found."
+    note = f"\n\n_Showing the {limit} most recent entries._" if next_cursor else ""
+    return f"### {title}\n{_markdown_table(headers, [format_row(r) for r in rows])}{note}"
+
+def answer_records_intents(user_id: int, intents) -> str:
+    """Answer a plain records request from the database as markdown tables, one per requested intent"""
+    intents = set(intents)
+    if ALL_RECORDS in intents:
+        intents.update(RECORDS_INTENTS)
+    # Every table at once gets fewer rows each
+    limit = 5 if len(intents) > 2 else RECORDS_ANSWER_LIMIT
+    sections = []
+    if WEIGHT_RECORDS in intents:
+        sections.append(_records_section(
+            "⚖️ Weight History", get_weight_logs_page(user_id, limit=limit), ["Date", "Weight (kg)"],
+            lambda w: (w['date'].strftime('%Y-%m-%d'), w['weight']), limit))
+    if STRESS_RECORDS in intents:
+        sections.append(_records_section(
+            "😌 Stress History", get_stress_logs_page(user_id, limit=limit), ["Date", "Stress Level"],
+            lambda s: (s['date'].strftime('%Y-%m-%d'), f"{s['stress_score']}/10"), limit))
+    if ACTIVITY_RECORDS in intents:
+        sections.append(_records_section(
+            "🏃‍♂️ Activity History", get_activities_page(user_id, limit=limit), ["Date", "Activity", "Duration"],
+            lambda a: (a['date'].strftime('%Y-%m-%d'), a['activity_type'], f"{a['duration']} min"), limit))
+    if ASSESSMENT_RECORDS in intents:
+        sections.append(_records_section(
+            "📋 Assessments", get_assessments_page(user_id, limit=limit),
+            ["Date", "Stress", "BMI", "Activity Level", "Physical Score"],
+            lambda a: (a['date'].strftime('%Y-%m-%d'), f"{a['stress_score']}/10",
+                       f"{a['bmi']} ({interpret_bmi(a['bmi'])})", a['activity_level'], a['physical_score']),
+            limit))
+    if MOBILITY_RECORDS in intents:
+        sections.append(_records_section(
+            "🧘 Mobility Tests", get_mobility_tests_page(user_id, limit=limit), ["Date", "Test", "Score", "Notes"],
+            lambda m: (m['date'].strftime('%Y-%m-%d'), m['test_name'], m['score'], m['notes'] or ""), limit))
+    if CHALLENGE_RECORDS in intents:
+        challenges = get_active_challenges(user_id)
+        sections.append(_records_section(
+            "🎯 Active Challenges", (challenges, None), ["Challenge", "Started", "Day", "Completed Tasks"],
+            lambda c: (c['challenge_name'], c['start_date'].strftime('%Y-%m-%d'),
+                       (c['progress'] or {}).get('current_day', '-'),
+                       len((c['progress'] or {}).get('completed_tasks', []))), limit))
+    return "Here are your records:\n\n" + "\n\n".join(sections)
+
+def load_conversation_context(user_id: int, user_message: str, memory=None) -> Dict:
+    """Return {'summary', 'turns', 'snippets'}: what the prompt takes from the conversation
+
+    `memory` is the result of get_conversation_memory, read here if not given.
+    """
+    # Conversation memory: a rolling summary of older turns plus the last few
+    # turns in order, so its size stays flat however long the chat runs
+    if memory is None:
+        memory = get_conversation_memory(user_id)
+    recent_turns = memory['turns']
+    # The current prompt is usually already saved; it is appended separately
+    if (recent_turns and recent_turns[-1]['role'] == 'user'
+            and recent_turns[-1]['content'] == truncate_to_tokens(user_message, MEMORY_TURN_TOKENS)):
+        recent_turns = recent_turns[:-1]
+
+    # Wellness content and older chat turns that match the question; turns
+    # already in the recent window are not retrieved twice
+    snippets = retrieve_snippets(user_id, user_message,
+                                 exclude_turns=[turn['content'] for turn in memory['turns']])
+    return {'summary': memory['summary'], 'turns': recent_turns, 'snippets': snippets}
+
+def build_chat_messages(user_id: int, user_message: str, previous_response: str = "", intents=None,
+                        conversation=None) -> List[Dict]:
+    """Build the system prompt and message list for a chat completion
+
+    `conversation` is the result of load_conversation_context, loaded here if not given.
+    """
+    if intents is None:
+        intents = match_intents(user_message)
+    if conversation is None:
+        conversation = load_conversation_context(user_id, user_message)
+    recent_turns = conversation['turns']
+    snippets = conversation['snippets']
+
+    # Only the latest rows of each section are read; whole-history statistics
+    # come from the rollups
+    user_data = get_user_data(user_id, single_query=True, limits=CONTEXT_ROW_LIMITS)
+    totals = get_history_totals(user_id)
+
+    # Check if user is asking about "my story" or "my health journey"
+    is_asking_about_health_journey = HEALTH_JOURNEY in intents
+
+    # Summarize the records within a fixed token budget so the prompt does not
+    # grow with the length of the user's history
+    user_context = build_user_context(user_data, interpret_bmi, totals=totals)
+
+    # Build system message with user data context
+    system_content = f"""You are HealthyRemote, a wellness assistant for {user_data['name']}. 
+You have access to their complete health records, previous conversation context, and previous assessments.
+Long histories are summarized as statistics and trends followed by the most recent entries:
+
+{user_context}
+
+Summary of the earlier conversation: {conversation['summary'] or 'Nothing yet.'}
 
 Important formatting instructions:
 - Keep paragraphs short (2-4 sentences max)
@@ -104,97 +177,240 @@ Important formatting instructions:
 - When providing user data or health information, always format it clearly with headers and line breaks
 - When discussing the user's health journey, provide insights based on their data in a supportive, encouraging manner"""
 
-        system_content += "\n\nWhen talking about 'my journey' or 'my health journey', the user is referring to their personal health data and progress. Provide meaningful insights and patterns from their data."
-            
-        system_message = {
-            "role": "system",
-            "content": system_content
-        }
-        
-        messages = [system_message]
-        
-        # Handle different message types based on context
-        if is_asking_about_health_journey:
+    if snippets:
+        system_content += "\n\nRelevant notes (retrieved, use them only if they help):\n" + "\n".join(f"- {s}" for s in snippets)
+
+    system_content += "\n\nWhen talking about 'my journey' or 'my health journey', the user is referring to their personal health data and progress. Provide meaningful insights and patterns from their data."
+
+    system_message = {
+        "role": "system",
+        "content": system_content
+    }
+
+    messages = [system_message]
+    messages.extend({"role": turn['role'], "content": turn['content']} for turn in recent_turns)
+
+    # Handle different message types based on context
+    if is_asking_about_health_journey:
+        messages.append({"role": "user", "content": user_message})
+        messages.append({"role": "system", "content": "Analyze the user's health data to create a meaningful summary of their wellness journey. Include key trends, improvements, and areas that may need attention. Be supportive and encouraging."})
+
+    elif CONTINUATION in intents and previous_response:
+        # Get last response and tell the API to continue from there
+        messages.append({"role": "assistant", "content": previous_response})
+        messages.append({"role": "system", "content": 
+            "Continue providing information on the previous topic. Add more details, recommendations, or analysis as appropriate."
+        })
+        messages.append({"role": "user", "content": "Please continue with more information on this topic."})
+
+    else:
+        # Check for specific request types to customize instructions
+        is_data_request = bool(intents & DATA_INTENTS)
+
+        if is_data_request:
             messages.append({"role": "user", "content": user_message})
-            messages.append({"role": "system", "content": "Analyze the user's health data to create a meaningful summary of their wellness journey. Include key trends, improvements, and areas that may need attention. Be supportive and encouraging."})
-            
-        elif is_continuation_request and previous_response:
-            # Get last response and tell the API to continue from there
-            messages.append({"role": "assistant", "content": previous_response})
-            messages.append({"role": "system", "content": 
-                "Continue providing information on the previous topic. Add more details, recommendations, or analysis as appropriate."
-            })
-            messages.append({"role": "user", "content": "Please continue with more information on this topic."})
-            
+            messages.append({"role": "system", "content": "Provide the user's data in a clear, organized format with headers and bullet points. Include all relevant information from their health records."})
         else:
-            # Check for specific request types to customize instructions
-            is_data_request = any(phrase in user_message.lower() for phrase in
-                ["my data", "my information", "my records", "my history", "my assessments", "my logs", 
-                 "info about me", "tell me about me", "everything about me", "all the info", "all my data"])
-            
-            if is_data_request:
-                messages.append({"role": "user", "content": user_message})
-                messages.append({"role": "system", "content": "Provide the user's data in a clear, organized format with headers and bullet points. Include all relevant information from their health records."})
-            else:
-                messages.append({"role": "user", "content": user_message})
-        
-        # Generate response with 300 tokens
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=300
+            messages.append({"role": "user", "content": user_message})
+
+    return messages
+
+# Continuations are prefetched in the background so the visible answer is not held up
+_continuation_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="continuation-prefetch")
+# Seconds an unfinished prefetch may go without new tokens before it is generated again
+CONTINUATION_WAIT_TIMEOUT = float(os.getenv("ASSISTANT_CONTINUATION_WAIT", "20"))
+
+def _stream_completion(messages, chunks):
+    """Yield completion tokens, appending them to chunks; returns the finish reason"""
+    stream = stream_chat_completion(messages, max_tokens=300)
+    finish_reason = None
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.delta.content:
+                chunks.append(choice.delta.content)
+                yield choice.delta.content
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+    finally:
+        stream.close()
+    return finish_reason
+
+def _prefetch_continuation(messages, cancelled, parts):
+    """Worker: generate the continuation into parts unless it is cancelled first"""
+    for _ in _stream_completion(messages, parts):
+        if cancelled.is_set():
+            return None
+    return format_response_text("".join(parts))
+
+def _stop_prefetch(pending):
+    pending["cancelled"].set()
+    pending["future"].cancel()
+
+def _prefetch_failed(future):
+    return not future.done() or future.cancelled() or future.exception() is not None
+
+def cancel_continuation_prefetch():
+    """Drop the pending continuation, stopping its generation if still running"""
+    pending = st.session_state.pop("pending_continuation", None)
+    if pending:
+        _stop_prefetch(pending)
+    return pending
+
+def take_prefetched_continuation():
+    """Pop the pending continuation without stopping it (None if there is none).
+
+    The prefetch may still be running; the caller follows its tokens instead
+    of asking the model for the same text again.
+    """
+    return st.session_state.pop("pending_continuation", None)
+
+def _follow_continuation(pending, chunks, timeout=CONTINUATION_WAIT_TIMEOUT):
+    """Yield a taken continuation: at once if it is ready, else its tokens as the prefetch receives them.
+
+    If the prefetch fails, or sends nothing for timeout seconds, it is stopped
+    and the continuation is generated again unless part of it was already shown.
+    """
+    future, parts = pending["future"], pending["parts"]
+    if not _prefetch_failed(future):
+        chunks.append(future.result())
+        yield chunks[-1]
+        return
+
+    shown = 0
+    deadline = time.monotonic() + timeout
+    while True:
+        done = future.done()
+        # parts only grows, and is complete once the future is done
+        while shown < len(parts):
+            chunks.append(parts[shown])
+            yield parts[shown]
+            shown += 1
+            deadline = time.monotonic() + timeout
+        if done or time.monotonic() > deadline:
+            break
+        wait([future], timeout=0.05)
+
+    if _prefetch_failed(future):
+        _stop_prefetch(pending)
+        if shown == 0:
+            yield from _stream_completion(pending["messages"], chunks)
+
+def start_continuation_prefetch(continuation_messages):
+    """Generate the continuation in the background; it is picked up when the user asks for more"""
+    cancel_continuation_prefetch()
+    cancelled = threading.Event()
+    parts = []
+    st.session_state.pending_continuation = {
+        "future": _continuation_executor.submit(_prefetch_continuation, continuation_messages, cancelled, parts),
+        "cancelled": cancelled,
+        "parts": parts,
+        "messages": continuation_messages,
+    }
+
+def prepare_continuation(messages, response_text, finish_reason, user_message, formatted_response, intents=None):
+    """Prefetch a continuation if the answer looks incomplete.
+
+    Returns the prompt to append and the continuation messages (None if no continuation is needed).
+    """
+    # Detect user language (simple approach)
+    if intents is None:
+        intents = match_intents(user_message)
+    is_spanish = SPANISH in intents
+
+    # Create continuation message based on language
+    continue_message = "¿Quieres ver más?... (Escribe 'continuar')" if is_spanish else "Would you like to see more?... (Write 'continue')"
+
+    # Handle response continuation
+    needs_continuation = False
+
+    # Case 1: API indicates response was cut off
+    if finish_reason == "length":
+        needs_continuation = True
+    # Case 2: Our heuristics suggest the response might be incomplete
+    elif should_add_continuation_prompt(formatted_response, user_message) and "Would you like to see more" not in formatted_response:
+        needs_continuation = True
+
+    if not needs_continuation:
+        return "", None
+
+    # Generate the continuation response
+    continuation_messages = messages.copy()
+    continuation_messages.append({"role": "assistant", "content": response_text})
+    continuation_messages.append({"role": "system", "content": "Continue the previous response with additional relevant details."})
+    continuation_messages.append({"role": "user", "content": "Please continue with more information."})
+
+    start_continuation_prefetch(continuation_messages)
+
+    # Add continuation prompt to original response
+    if "Would you like to see more" not in formatted_response and "¿Quieres ver más?" not in formatted_response:
+        return f"\n\n{continue_message}", continuation_messages
+    return "", continuation_messages
+
+def stream_ai_response(user_id: int, user_message: str, previous_response: str = "") -> Iterator[str]:
+    """Yield the AI response token by token (for st.write_stream) and save it when done"""
+    chunks = []
+    try:
+        # One pass over the message finds every intent used below
+        intents = match_intents(user_message)
+
+        # If it's a continuation, send the prefetched text at once or stream it
+        # from the prefetch still running; any other message makes a pending
+        # continuation obsolete
+        if CONTINUATION in intents:
+            pending = take_prefetched_continuation()
+            if pending:
+                yield from _follow_continuation(pending, chunks)
+                return
+        else:
+            cancel_continuation_prefetch()
+
+        # Plain records requests are answered from the database without the model
+        records_intents = local_records_intents(intents)
+        if records_intents:
+            chunks.append(answer_records_intents(user_id, records_intents))
+            yield chunks[-1]
+            return
+
+        # Repeated questions are answered from the cache until the user logs new
+        # data or the conversation summary moves on; retrieval only runs on a miss
+        memory = get_conversation_memory(user_id)
+        cache_key = response_cache_key(user_id, user_message, memory['summary'])
+        found, cached = get_cached_response(cache_key)
+        if found:
+            if cached["continuation_messages"]:
+                start_continuation_prefetch(cached["continuation_messages"])
+            chunks.append(cached["text"])
+            yield cached["text"]
+            return
+
+        conversation = load_conversation_context(user_id, user_message, memory)
+        messages = build_chat_messages(user_id, user_message, previous_response, intents, conversation)
+        finish_reason = yield from _stream_completion(messages, chunks)
+
+        # Tokens are shown as they arrive, so the continuation checks run on the full text
+        response_text = "".join(chunks)
+        continuation_prompt, continuation_messages = prepare_continuation(
+            messages, response_text, finish_reason, user_message,
+            format_response_text(response_text), intents
         )
-        
-        response_text = response.choices[0].message.content
-        finish_reason = response.choices[0].finish_reason
-        
-        # Process response for better formatting
-        formatted_response = format_response_text(response_text)
-        
-        # Detect user language (simple approach)
-        is_spanish = any(word in user_message.lower() for word in 
-                      ["como", "qué", "porque", "gracias", "hola", "por favor", "puedes", "continuar"])
-        
-        # Create continuation message based on language
-        continue_message = "¿Quieres ver más?... (Escribe 'continuar')" if is_spanish else "Would you like to see more?... (Write 'continue')"
-        
-        # Handle response continuation
-        needs_continuation = False
-        
-        # Case 1: API indicates response was cut off
-        if finish_reason == "length":
-            needs_continuation = True
-        # Case 2: Our heuristics suggest the response might be incomplete
-        elif should_add_continuation_prompt(formatted_response, user_message) and "Would you like to see more" not in formatted_response:
-            needs_continuation = True
-            
-        # Generate and store continuation if needed
-        if needs_continuation:
-            # Generate the continuation response
-            continuation_messages = messages.copy()
-            continuation_messages.append({"role": "assistant", "content": response_text})
-            continuation_messages.append({"role": "system", "content": "Continue the previous response with additional relevant details."})
-            continuation_messages.append({"role": "user", "content": "Please continue with more information."})
-            
-            continuation_response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=continuation_messages,
-                temperature=0.7,
-                max_tokens=300
-            )
-            
-            # Store continuation for when user asks for more
-            st.session_state.remaining_response = format_response_text(continuation_response.choices[0].message.content)
-            
-            # Add continuation prompt to original response
-            if "Would you like to see more" not in formatted_response and "¿Quieres ver más?" not in formatted_response:
-                formatted_response += f"\n\n{continue_message}"
+        if continuation_prompt:
+            chunks.append(continuation_prompt)
+            yield continuation_prompt
+
+        cache_response(cache_key, {"text": "".join(chunks), "continuation_messages": continuation_messages})
 
-        return formatted_response
-        
     except Exception as e:
-        return f"I apologize, but I encountered an error: {str(e)}"
+        chunks.append(f"I apologize, but I encountered an error: {str(e)}")
+        yield chunks[-1]
+
+    finally:
+        # Persist whatever was shown, even if the page stopped consuming the stream early
+        if chunks:
+            queue_chat_message(user_id, "assistant", "".join(chunks))
+            schedule_summary_update(user_id)
 
 def format_response_text(response_text):
     """Format the AI response for better readability"""
@@ -0,0 +1,180 @@
+import os
+import re
+
+# Hard cap on the user-data part of the assistant's system prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("ASSISTANT_CONTEXT_TOKENS", "800"))
+# Raw points kept per series; older history is only described by summary stats
+RECENT_POINTS = int(os.getenv("ASSISTANT_RECENT_POINTS", "5"))
+# Latest rows read per history section; they give the trend and the recent
+# points, while whole-history statistics come from the rollups
+HISTORY_ROWS = int(os.getenv("ASSISTANT_HISTORY_ROWS", "60"))
+CONTEXT_ROW_LIMITS = {
+    'assessments': HISTORY_ROWS,
+    'activities': HISTORY_ROWS,
+    'stress_logs': HISTORY_ROWS,
+    'weight_logs': HISTORY_ROWS,
+    'active_challenges': HISTORY_ROWS,
+}
+
+# Rough BPE approximation: words split into ~4-character pieces, punctuation alone
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    """Estimate the token count of text without calling a tokenizer."""
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to roughly max_tokens, on a word boundary."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + " …"
+
+
+def _chronological(rows, value_key):
+    """Rows that have a date and a value, oldest first."""
+    points = [r for r in rows if r.get('date') is not None and r.get(value_key) is not None]
+    return sorted(points, key=lambda r: r['date'])
+
+
+def _slope_per_week(points, value_key):
+    """Least-squares slope of the series, in units per week."""
+    if len(points) < 2:
+        return 0.0
+    origin = points[0]['date']
+    xs = [(p['date'] - origin).total_seconds() / 86400 for p in points]
+    ys = [float(p[value_key]) for p in points]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return 0.0
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    return cov / var_x * 7
+
+
+def describe_trend(slope, flat_threshold, rising="rising", falling="falling"):
+    """Turn a weekly slope into a word."""
+    if abs(slope) < flat_threshold:
+        return "stable"
+    return rising if slope > 0 else falling
+
+
+def summarize_series(label, rows, value_key, unit, flat_threshold, recent=RECENT_POINTS, totals=None):
+    """Describe a time series by its statistics, trend and most recent raw points.
+
+    `totals` (entries, first, last, mean, min, max over the whole history)
+    replaces the statistics computed from rows, which may be only the latest.
+    """
+    points = _chronological(rows, value_key)
+    if not points:
+        return f"{label}: No data"
+
+    values = [float(p[value_key]) for p in points]
+    slope = _slope_per_week(points, value_key)
+    if totals is None:
+        totals = {'entries': len(points), 'first': points[0]['date'], 'last': points[-1]['date'],
+                  'mean': sum(values) / len(values), 'min': min(values), 'max': max(values)}
+    lines = [
+        f"{label}: {totals['entries']} entries from {totals['first']:%Y-%m-%d} to {totals['last']:%Y-%m-%d}",
+        f"  - Latest {values[-1]:g}{unit}, mean {totals['mean']:.1f}{unit}, "
+        f"min {float(totals['min']):g}{unit}, max {float(totals['max']):g}{unit}",
+        f"  - Trend over the last {len(points)} entries: {describe_trend(slope, flat_threshold)} "
+        f"({slope:+.2f}{unit} per week)",
+    ]
+    if recent > 0:
+        recent_points = ", ".join(f"{p['date']:%Y-%m-%d}: {p[value_key]:g}{unit}" for p in points[-recent:])
+        lines.append(f"  - Recent: {recent_points}")
+    return "\n".join(lines)
+
+
+def summarize_assessments(assessments, interpret_bmi, recent=RECENT_POINTS, totals=None):
+    """Latest assessment in full plus a short summary of the earlier ones."""
+    points = _chronological(assessments, 'date')
+    if not points:
+        return "Assessments: No data"
+
+    latest = points[-1]
+    count, first = (totals['entries'], totals['first']) if totals else (len(points), points[0]['date'])
+    lines = [
+        f"Assessments: {count} since {first:%Y-%m-%d}",
+        f"  - Latest ({latest['date']:%Y-%m-%d}): stress {latest.get('stress_score', 'N/A')}/10, "
+        f"BMI {latest.get('bmi', 'N/A')} ({interpret_bmi(latest.get('bmi'))}), "
+        f"activity level {latest.get('activity_level', 'N/A')}, physical score {latest.get('physical_score', 'N/A')}",
+    ]
+    scored = [p for p in points if p.get('stress_score') is not None]
+    if len(scored) > 1:
+        slope = _slope_per_week(scored, 'stress_score')
+        lines.append(f"  - Assessed stress trend: {describe_trend(slope, 0.1, 'worsening', 'improving')}")
+    if recent > 1 and len(points) > 1:
+        earlier = ", ".join(
+            f"{a['date']:%Y-%m-%d}: stress {a.get('stress_score', 'N/A')}, BMI {a.get('bmi', 'N/A')}"
+            for a in points[-recent:-1]
+        )
+        lines.append(f"  - Previous: {earlier}")
+    return "\n".join(lines)
+
+
+def summarize_activities(activities, totals=None):
+    """Activity totals and the most frequent activity types."""
+    if totals:
+        top = ", ".join(totals.get('top_types') or [])
+        return (f"Activities: {totals['entries']} recorded, {totals['minutes'] or 0} minutes in total, "
+                f"last on {totals['last']:%Y-%m-%d}; most frequent: {top}")
+    if not activities:
+        return "Activities: No data"
+    minutes = sum(a.get('duration') or 0 for a in activities)
+    by_type = {}
+    for a in activities:
+        activity_type = a.get('activity_type') or 'other'
+        by_type[activity_type] = by_type.get(activity_type, 0) + 1
+    top = ", ".join(f"{t} ({n})" for t, n in sorted(by_type.items(), key=lambda item: -item[1])[:3])
+    dated = [a['date'] for a in activities if a.get('date') is not None]
+    last = f", last on {max(dated):%Y-%m-%d}" if dated else ""
+    return f"Activities: {len(activities)} recorded, {minutes} minutes in total{last}; most frequent: {top}"
+
+
+def build_user_context(user_data, interpret_bmi, budget=CONTEXT_TOKEN_BUDGET, recent=RECENT_POINTS, totals=None):
+    """Render the user's records for the system prompt within a token budget.
+
+    user_data is expected to hold only the latest rows of each section (see
+    CONTEXT_ROW_LIMITS); `totals`, keyed by section, describes the whole
+    history. Sections are listed in priority order. When the text is over
+    budget the raw points are trimmed first, then the lowest-priority sections
+    are dropped, so the size stays flat regardless of how much history exists.
+    """
+    totals = totals or {}
+
+    def render(recent_points):
+        return [
+            summarize_assessments(user_data.get('assessments', []), interpret_bmi, recent_points,
+                                  totals.get('assessments')),
+            summarize_series("Stress log", user_data.get('stress_logs', []), 'stress_score', "/10", 0.1,
+                             recent_points, totals.get('stress_logs')),
+            summarize_series("Weight log", user_data.get('weight_logs', []), 'weight', "kg", 0.1,
+                             recent_points, totals.get('weight_logs')),
+            "Active challenges: " + (", ".join(c['challenge_name'] for c in user_data.get('active_challenges', [])) or "None"),
+            summarize_activities(user_data.get('activities', []), totals.get('activities')),
+        ]
+
+    for recent_points in range(recent, -1, -1):
+        sections = render(recent_points)
+        if count_tokens("\n".join(sections)) <= budget:
+            return "\n".join(sections)
+
+    while len(sections) > 1 and count_tokens("\n".join(sections)) > budget:
+        sections.pop()
+    text = "\n".join(sections)
+    # A single section can still be too large (e.g. a huge budget cut); trim it by words
+    while count_tokens(text) > budget:
+        text = text.rsplit(" ", 1)[0] if " " in text else ""
+    return text
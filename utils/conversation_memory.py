@@ -0,0 +1,173 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .db_pool import get_connection
+from .db_metrics import instrumented, logger
+from .cache import cached_reader, invalidate_user, CHAT
+from .chat_writer import flush_chat_writes, pending_chat_messages
+from .context_builder import truncate_to_tokens
+from .llm_client import chat_completion
+
+# Raw turns passed to the model verbatim; everything older lives in the summary
+MEMORY_RECENT_TURNS = int(os.getenv("CHAT_MEMORY_RECENT_TURNS", "8"))
+# Older turns that must pile up before the summary is refreshed
+MEMORY_SUMMARIZE_AFTER = int(os.getenv("CHAT_MEMORY_SUMMARIZE_AFTER", "6"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("CHAT_MEMORY_SUMMARY_TOKENS", "250"))
+# Per-turn cap, so one long answer cannot crowd out the rest of the memory
+MEMORY_TURN_TOKENS = int(os.getenv("CHAT_MEMORY_TURN_TOKENS", "200"))
+# Turns folded into the summary per model call
+MEMORY_SUMMARY_BATCH = 200
+
+_SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and HealthyRemote, "
+    "a wellness assistant for remote workers. Merge the new turns into the existing summary. "
+    "Keep the user's goals, concerns, symptoms, preferences, advice already given and anything "
+    f"they committed to. Drop greetings and small talk. Stay under {MEMORY_SUMMARY_TOKENS * 3 // 4} words."
+)
+
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def _memory_turn(role, content):
+    return {'role': role, 'content': truncate_to_tokens(content or "", MEMORY_TURN_TOKENS)}
+
+
+@cached_reader(CHAT)
+@instrumented
+def _get_saved_memory(user_id, recent_turns):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT summary FROM chat_summaries WHERE user_id = %s", (user_id,))
+        row = cur.fetchone()
+        cur.execute("""
+            SELECT role, content FROM (
+                SELECT id, role, content, timestamp FROM chat_history
+                WHERE user_id = %s
+                ORDER BY timestamp DESC, id DESC
+                LIMIT %s
+            ) t
+            ORDER BY timestamp, id
+        """, (user_id, recent_turns))
+        turns = cur.fetchall()
+        cur.close()
+    return {
+        'summary': row['summary'] if row else "",
+        'turns': [_memory_turn(t['role'], t['content']) for t in turns],
+    }
+
+
+def get_conversation_memory(user_id, recent_turns=MEMORY_RECENT_TURNS):
+    """Return {'summary', 'turns'}: the rolling summary and the last turns, oldest first.
+
+    Messages still in the write-behind queue are merged in from memory rather
+    than waited for, so the prompt just queued does not hold up the answer.
+    """
+    # Taken before the read: a message committed meanwhile is then in both lists
+    pending = [_memory_turn(role, content) for role, content in pending_chat_messages(user_id)]
+    saved = _get_saved_memory(user_id, recent_turns)
+    if not pending:
+        return saved
+    turns = saved['turns']
+    # The queue commits in order, so the part of it already saved is a prefix
+    # of it that ends the saved turns
+    overlap = next((k for k in range(min(len(pending), len(turns)), 0, -1) if turns[-k:] == pending[:k]), 0)
+    return {'summary': saved['summary'], 'turns': (turns + pending[overlap:])[-recent_turns:]}
+
+
+def _summarize(previous_summary, turns):
+    transcript = "\n".join(
+        f"{'User' if t['role'] == 'user' else 'Assistant'}: {truncate_to_tokens(t['content'] or '', MEMORY_TURN_TOKENS)}"
+        for t in turns
+    )
+    response = chat_completion([
+        {"role": "system", "content": _SUMMARY_INSTRUCTIONS},
+        {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none yet)'}\n\nNew turns:\n{transcript}"},
+    ], max_tokens=MEMORY_SUMMARY_TOKENS, temperature=0.2)
+    return truncate_to_tokens(response.choices[0].message.content.strip(), MEMORY_SUMMARY_TOKENS)
+
+
+@instrumented
+def update_conversation_summary(user_id, recent_turns=MEMORY_RECENT_TURNS):
+    """Fold turns older than the recent window into the user's summary.
+
+    Returns the number of turns summarized. The model call happens outside any
+    transaction, and the upsert only moves the summary forward, so concurrent
+    runs cannot overwrite a newer summary with an older one.
+    """
+    flush_chat_writes(user_id)
+    summarized = 0
+    while True:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT summary, last_message_id FROM chat_summaries WHERE user_id = %s", (user_id,)
+            )
+            row = cur.fetchone()
+            previous_summary, last_id = (row['summary'], row['last_message_id']) if row else ("", 0)
+            # Everything below the oldest of the recent turns is summary material
+            cur.execute("""
+                SELECT COALESCE(MIN(id), 0) AS boundary FROM (
+                    SELECT id FROM chat_history WHERE user_id = %s ORDER BY id DESC LIMIT %s
+                ) recent
+            """, (user_id, recent_turns))
+            boundary = cur.fetchone()['boundary']
+            cur.execute("""
+                SELECT id, role, content FROM chat_history
+                WHERE user_id = %s AND id > %s AND id < %s
+                ORDER BY id
+                LIMIT %s
+            """, (user_id, last_id, boundary, MEMORY_SUMMARY_BATCH))
+            turns = cur.fetchall()
+            conn.rollback()
+            cur.close()
+
+        if len(turns) < (MEMORY_SUMMARIZE_AFTER if summarized == 0 else 1):
+            break
+        summary = _summarize(previous_summary, turns)
+
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO chat_summaries (user_id, summary, last_message_id, turns_summarized)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    summary = EXCLUDED.summary,
+                    last_message_id = EXCLUDED.last_message_id,
+                    turns_summarized = chat_summaries.turns_summarized + EXCLUDED.turns_summarized,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE chat_summaries.last_message_id = %s
+            """, (user_id, summary, turns[-1]['id'], len(turns), last_id))
+            applied = cur.rowcount
+            conn.commit()
+            cur.close()
+        if not applied:
+            break  # another worker moved the summary on first
+        summarized += len(turns)
+        if len(turns) < MEMORY_SUMMARY_BATCH:
+            break
+
+    if summarized:
+        invalidate_user(user_id, (CHAT,))
+    return summarized
+
+
+def schedule_summary_update(user_id):
+    """Refresh the user's summary in the background; at most one run per user at a time."""
+    with _in_flight_lock:
+        if user_id in _in_flight:
+            return
+        _in_flight.add(user_id)
+
+    def run():
+        try:
+            update_conversation_summary(user_id)
+        except Exception:
+            logger.exception("Failed to update the conversation summary of user %s", user_id)
+        finally:
+            with _in_flight_lock:
+                _in_flight.discard(user_id)
+
+    _summary_executor.submit(run)
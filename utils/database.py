@@ -1,569 +1,744 @@
-import os
+import io
 import pandas as pd
 from datetime import datetime
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from .db_pool import get_connection, get_database_url
+from .migrations import run_migrations
+from .db_metrics import instrumented
+from .prepared import execute_prepared
+from .cache import cached_reader, invalidate_user, DATA, CHAT
+from .rollups import ROLLUP_SOURCES, refresh_rollup_day, refresh_rollups
+from .chat_writer import flush_chat_writes
 
 
+@instrumented
 def get_user_by_email(email):
     """Get user by email address."""
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_connection() as conn:
+        cur = conn.cursor()
 
-    cur.execute("""
-        SELECT id FROM users 
-        WHERE email = %s
-    """, (email,))
+        execute_prepared(cur, 'get_user_by_email', (email,))
 
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+        user = cur.fetchone()
+        cur.close()
 
     return user['id'] if user else None
 
+@instrumented
 def create_new_user(name, email):
     """Create a new user with name and email."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        cur.execute("""
-            INSERT INTO users (name, email) 
-            VALUES (%s, %s)
-            RETURNING id
-        """, (name, email))
-
-        user_id = cur.fetchone()['id']
-        conn.commit()
-        return user_id
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
-        conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        try:
+            cur.execute("""
+                INSERT INTO users (name, email)
+                VALUES (%s, %s)
+                RETURNING id
+            """, (name, email))
+
+            user_id = cur.fetchone()['id']
+            conn.commit()
+            return user_id
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
 
 def get_db_connection():
-    """Create a database connection."""
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        raise ValueError("DATABASE_URL not found in environment variables")
-    print(f"Connecting to: {database_url}")  # For debugging
+    """Open a dedicated, unpooled connection (prefer get_connection() in app code)."""
     return psycopg2.connect(
-        database_url,
+        get_database_url(),
         cursor_factory=RealDictCursor
     )
 
 def init_db():
-    """Initialize the database tables."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    # Create users table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(255),
-            email VARCHAR(255) UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # Create assessments table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS assessments (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id),
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            stress_score INTEGER,
-            bmi FLOAT,
-            activity_level VARCHAR(50),
-            physical_score INTEGER,
-            pain_points JSONB,
-            CONSTRAINT stress_score_range CHECK (stress_score BETWEEN 0 AND 10)
-        )
-    """)
-
-    # Create activities table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS activities (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id),
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            activity_type VARCHAR(50),
-            duration INTEGER,
-            CONSTRAINT duration_check CHECK (duration > 0)
-        )
-    """)
-
-    # Create stress_logs table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS stress_logs (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id),
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            stress_score INTEGER,
-            CONSTRAINT stress_log_score_range CHECK (stress_score BETWEEN 0 AND 10)
-        )
-    """)
-
-    # Create weight_logs table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS weight_logs (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id),
-            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            weight FLOAT,
-            CONSTRAINT weight_check CHECK (weight > 0)
-        )
-    """)
-
-    # Handle mobility_tests table creation
-    try:
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS mobility_tests (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id),
-                date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                test_name VARCHAR(50),
-                score VARCHAR(50),
-                notes TEXT
-            )
-        """)
-    except psycopg2.errors.UniqueViolation:
-        conn.rollback()
-        # Table already exists, skip creation
-
-    # Handle challenges table creation
-    try:
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS challenges (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id),
-                challenge_name VARCHAR(100),
-                start_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                end_date TIMESTAMP,
-                status VARCHAR(20) DEFAULT 'active',
-                progress JSONB
-            )
-        """)
-    except psycopg2.errors.UniqueViolation:
-        conn.rollback()
-        # Table already exists, skip creation
-
-    # Add this line to create the chat_history table
-    init_chat_table()
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    """Initialize the database schema (applies pending migrations once per process)."""
+    run_migrations()
 
+@instrumented
 def get_or_create_user():
     """This function is kept for backward compatibility."""
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_connection() as conn:
+        cur = conn.cursor()
 
-    # For now, we'll just create a new user if none exists
-    cur.execute("SELECT id FROM users WHERE name IS NULL LIMIT 1")
-    user = cur.fetchone()
-
-    if not user:
-        cur.execute("INSERT INTO users DEFAULT VALUES RETURNING id")
+        # For now, we'll just create a new user if none exists
+        cur.execute("SELECT id FROM users WHERE name IS NULL LIMIT 1")
         user = cur.fetchone()
-        conn.commit()
 
-    user_id = user['id']
-    cur.close()
-    conn.close()
+        if not user:
+            cur.execute("INSERT INTO users DEFAULT VALUES RETURNING id")
+            user = cur.fetchone()
+            conn.commit()
+
+        user_id = user['id']
+        cur.close()
     return user_id
 
+@instrumented
 def save_assessment(user_id, assessment_data):
     """Save an assessment to the database."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO assessments 
-        (user_id, stress_score, bmi, activity_level, physical_score, pain_points)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        RETURNING id
-    """, (
-        user_id,
-        assessment_data['stress_score'],
-        assessment_data['bmi'],
-        assessment_data['activity_level'],
-        assessment_data['physical_score'],
-        Json(assessment_data['pain_points'])  # Convert dict to JSON
-    ))
-
-    assessment_id = cur.fetchone()['id']
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'insert_assessment', (
+            user_id,
+            assessment_data['stress_score'],
+            assessment_data['bmi'],
+            assessment_data['activity_level'],
+            assessment_data['physical_score'],
+            Json(assessment_data['pain_points'])  # Convert dict to JSON
+        ))
+
+        assessment_id = cur.fetchone()['id']
+        conn.commit()
+        cur.close()
+    invalidate_user(user_id)
     return assessment_id
 
+@cached_reader(DATA)
+@instrumented
 def get_assessments(user_id):
     """Get all assessments for a user."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT * FROM assessments 
-        WHERE user_id = %s 
-        ORDER BY date DESC
-    """, (user_id,))
-
-    assessments = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'get_assessments', (user_id,))
+
+        assessments = cur.fetchall()
+        cur.close()
     return assessments
 
+@instrumented
 def save_activity(user_id, activity_data):
     """Save an activity to the database."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO activities 
-        (user_id, activity_type, duration)
-        VALUES (%s, %s, %s)
-        RETURNING id
-    """, (
-        user_id,
-        activity_data['activity_type'],  
-        activity_data['duration']
-    ))
-
-    activity_id = cur.fetchone()['id']
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'insert_activity', (
+            user_id,
+            activity_data['activity_type'],
+            activity_data['duration']
+        ))
+
+        row = cur.fetchone()
+        activity_id = row['id']
+        refresh_rollup_day(cur, 'activities', user_id, row['date'])
+        conn.commit()
+        cur.close()
+    invalidate_user(user_id)
     return activity_id
 
+@cached_reader(DATA)
+@instrumented
 def get_activities(user_id):
     """Get all activities for a user."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT * FROM activities 
-        WHERE user_id = %s 
-        ORDER BY date DESC
-    """, (user_id,))
-
-    activities = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'get_activities', (user_id,))
+
+        activities = cur.fetchall()
+        cur.close()
     return activities
 
+@cached_reader(DATA)
+@instrumented
+def get_activity_count(user_id):
+    """Number of activities a user has logged, counted by the database."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'count_activities', (user_id,))
+
+        count = cur.fetchone()['count']
+        cur.close()
+    return count
+
+@instrumented
 def save_stress_log(user_id, stress_score):
     """Save a stress log entry."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO stress_logs 
-        (user_id, stress_score)
-        VALUES (%s, %s)
-        RETURNING id
-    """, (user_id, stress_score))
-
-    log_id = cur.fetchone()['id']
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'insert_stress_log', (user_id, stress_score))
+
+        row = cur.fetchone()
+        log_id = row['id']
+        refresh_rollup_day(cur, 'stress_logs', user_id, row['date'])
+        conn.commit()
+        cur.close()
+    invalidate_user(user_id)
     return log_id
 
+@cached_reader(DATA)
+@instrumented
 def get_stress_logs(user_id):
     """Get all stress logs for a user."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT * FROM stress_logs 
-        WHERE user_id = %s 
-        ORDER BY date DESC
-    """, (user_id,))
-
-    logs = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'get_stress_logs', (user_id,))
+
+        logs = cur.fetchall()
+        cur.close()
     return logs
 
+@instrumented
 def save_weight_log(user_id, weight):
     """Save a weight log entry."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO weight_logs 
-        (user_id, weight)
-        VALUES (%s, %s)
-        RETURNING id
-    """, (user_id, weight))
-
-    log_id = cur.fetchone()['id']
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'insert_weight_log', (user_id, weight))
+
+        row = cur.fetchone()
+        log_id = row['id']
+        refresh_rollup_day(cur, 'weight_logs', user_id, row['date'])
+        conn.commit()
+        cur.close()
+    invalidate_user(user_id)
     return log_id
 
+@cached_reader(DATA)
+@instrumented
 def get_weight_logs(user_id):
     """Get all weight logs for a user."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT * FROM weight_logs 
-        WHERE user_id = %s 
-        ORDER BY date DESC
-    """, (user_id,))
-
-    logs = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'get_weight_logs', (user_id,))
+
+        logs = cur.fetchall()
+        cur.close()
     return logs
 
+@instrumented
 def save_mobility_test(user_id, test_data):
     """Save mobility test results."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO mobility_tests 
-        (user_id, test_name, score, notes)
-        VALUES (%s, %s, %s, %s)
-        RETURNING id
-    """, (
-        user_id,
-        test_data['test_name'],
-        test_data['score'],
-        test_data.get('notes', '')
-    ))
-
-    test_id = cur.fetchone()['id']
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'insert_mobility_test', (
+            user_id,
+            test_data['test_name'],
+            test_data['score'],
+            test_data.get('notes', '')
+        ))
+
+        test_id = cur.fetchone()['id']
+        conn.commit()
+        cur.close()
+    invalidate_user(user_id)
     return test_id
 
+@cached_reader(DATA)
+@instrumented
 def get_mobility_tests(user_id):
     """Get all mobility tests for a user."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT * FROM mobility_tests 
-        WHERE user_id = %s 
-        ORDER BY date DESC
-    """, (user_id,))
-
-    tests = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'get_mobility_tests', (user_id,))
+
+        tests = cur.fetchall()
+        cur.close()
     return tests
 
+@instrumented
 def start_challenge(user_id, challenge_data):
     """Start a new challenge for a user."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO challenges 
-        (user_id, challenge_name, end_date, progress)
-        VALUES (%s, %s, CURRENT_TIMESTAMP + INTERVAL '%s days', %s)
-        RETURNING id
-    """, (
-        user_id,
-        challenge_data['name'],
-        challenge_data['duration'],
-        Json({'completed_tasks': [], 'current_day': 1})
-    ))
-
-    challenge_id = cur.fetchone()['id']
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            INSERT INTO challenges
+            (user_id, challenge_name, end_date, progress)
+            VALUES (%s, %s, CURRENT_TIMESTAMP + INTERVAL '%s days', %s)
+            RETURNING id
+        """, (
+            user_id,
+            challenge_data['name'],
+            challenge_data['duration'],
+            Json({'completed_tasks': [], 'current_day': 1})
+        ))
+
+        challenge_id = cur.fetchone()['id']
+        conn.commit()
+        cur.close()
+    invalidate_user(user_id)
     return challenge_id
 
+@instrumented
+def update_challenge_progress(challenge_id, progress):
+    """Update the progress of an existing challenge."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            UPDATE challenges
+            SET progress = %s
+            WHERE id = %s
+            RETURNING user_id
+        """, (Json(progress), challenge_id))
+
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+    if row:
+        invalidate_user(row['user_id'])
+
+@cached_reader(DATA)
+@instrumented
 def get_active_challenges(user_id):
     """Get all active challenges for a user."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT * FROM challenges 
-        WHERE user_id = %s AND status = 'active'
-        ORDER BY start_date DESC
-    """, (user_id,))
-
-    challenges = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+
+        execute_prepared(cur, 'get_active_challenges', (user_id,))
+
+        challenges = cur.fetchall()
+        cur.close()
     return challenges
 
-def get_user_data(user_id: int) -> dict:
-    """Get all user data including challenges"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    try:
-        # Get basic user info
-        cur.execute("""
-            SELECT name, email, created_at 
-            FROM users 
-            WHERE id = %s
-        """, (user_id,))
-        basic_info = cur.fetchone()
-        
-        if not basic_info:
-            return None
-            
-        # Get assessments with proper ordering
-        cur.execute("""
-            SELECT date, stress_score, bmi, activity_level, physical_score, pain_points 
-            FROM assessments 
-            WHERE user_id = %s 
+# Tables that support keyset-paginated history reads
+HISTORY_TABLES = ('assessments', 'activities', 'stress_logs', 'weight_logs', 'mobility_tests')
+
+def _get_history_page(table, user_id, limit, cursor, since, until):
+    """Read one page of a user's history, newest first.
+
+    `cursor` is the (date, id) of the last row of the previous page; `since`
+    (inclusive) and `until` (exclusive) bound the date window. Returns the rows
+    and the cursor for the next page, or None when there are no more rows.
+    Dates are NOT NULL, so the (date, id) comparison never drops a row.
+    """
+    if table not in HISTORY_TABLES:
+        raise ValueError(f"Unknown history table: {table}")
+
+    conditions = ["user_id = %s"]
+    params = [user_id]
+    if since is not None:
+        conditions.append("date >= %s")
+        params.append(since)
+    if until is not None:
+        conditions.append("date < %s")
+        params.append(until)
+    if cursor is not None:
+        conditions.append("(date, id) < (%s, %s)")
+        params.extend(cursor)
+    # Fetch one extra row to know whether another page exists
+    params.append(limit + 1)
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT * FROM {table}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY date DESC, id DESC
+            LIMIT %s
+        """, params)
+        rows = cur.fetchall()
+        cur.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1]['date'], rows[-1]['id'])
+    return rows, next_cursor
+
+@cached_reader(DATA)
+@instrumented
+def get_assessments_page(user_id, limit=20, cursor=None, since=None, until=None):
+    """Get one page of a user's assessments; returns (rows, next_cursor)."""
+    return _get_history_page('assessments', user_id, limit, cursor, since, until)
+
+@cached_reader(DATA)
+@instrumented
+def get_activities_page(user_id, limit=20, cursor=None, since=None, until=None):
+    """Get one page of a user's activities; returns (rows, next_cursor)."""
+    return _get_history_page('activities', user_id, limit, cursor, since, until)
+
+@cached_reader(DATA)
+@instrumented
+def get_stress_logs_page(user_id, limit=20, cursor=None, since=None, until=None):
+    """Get one page of a user's stress logs; returns (rows, next_cursor)."""
+    return _get_history_page('stress_logs', user_id, limit, cursor, since, until)
+
+@cached_reader(DATA)
+@instrumented
+def get_weight_logs_page(user_id, limit=20, cursor=None, since=None, until=None):
+    """Get one page of a user's weight logs; returns (rows, next_cursor)."""
+    return _get_history_page('weight_logs', user_id, limit, cursor, since, until)
+
+@cached_reader(DATA)
+@instrumented
+def get_mobility_tests_page(user_id, limit=20, cursor=None, since=None, until=None):
+    """Get one page of a user's mobility tests; returns (rows, next_cursor)."""
+    return _get_history_page('mobility_tests', user_id, limit, cursor, since, until)
+
+# Rows sent per statement (execute_values) or per COPY buffer in the bulk writers
+BULK_CHUNK_SIZE = 5000
+
+def _chunked(iterable, size):
+    """Yield lists of up to `size` items from any iterable without materializing it."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _copy_text_value(value):
+    """Encode one value for COPY ... FROM STDIN in text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def _bulk_insert(table, columns, rows, chunk_size, return_ids, method):
+    """Insert rows in chunks inside a single transaction.
+
+    Every row is a tuple of `columns` starting with user_id and ending with
+    date (None means "now"). Returns the new ids, or the row count when
+    return_ids is False or method is 'copy'.
+    """
+    if method not in ('values', 'copy'):
+        raise ValueError(f"Unknown bulk insert method: {method}")
+
+    user_ids = set()
+    ids = []
+    count = 0
+    column_list = ', '.join(columns)
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # One server timestamp for the whole batch keeps undated rows consistent
+        cur.execute("SELECT LOCALTIMESTAMP AS now")
+        now = cur.fetchone()['now']
+
+        for chunk in _chunked(rows, chunk_size):
+            chunk = [row[:-1] + (row[-1] or now,) for row in chunk]
+            user_ids.update(row[0] for row in chunk)
+
+            if method == 'copy':
+                buffer = io.StringIO()
+                for row in chunk:
+                    buffer.write('\t'.join(_copy_text_value(v) for v in row) + '\n')
+                buffer.seek(0)
+                cur.copy_expert(f"COPY {table} ({column_list}) FROM STDIN", buffer)
+            elif return_ids:
+                result = execute_values(
+                    cur,
+                    f"INSERT INTO {table} ({column_list}) VALUES %s RETURNING id",
+                    chunk,
+                    page_size=len(chunk),
+                    fetch=True
+                )
+                ids.extend(r['id'] for r in result)
+            else:
+                execute_values(
+                    cur,
+                    f"INSERT INTO {table} ({column_list}) VALUES %s",
+                    chunk,
+                    page_size=len(chunk)
+                )
+            count += len(chunk)
+
+        conn.commit()
+        cur.close()
+
+    for user_id in user_ids:
+        invalidate_user(user_id)
+    # Bulk loads are folded into the rollups by the watermark job rather than day by day
+    if table in ROLLUP_SOURCES:
+        refresh_rollups((table,))
+    return ids if return_ids and method == 'values' else count
+
+@instrumented
+def save_activities_bulk(records, chunk_size=BULK_CHUNK_SIZE, return_ids=True, method='values'):
+    """Save many activities at once.
+
+    Each record is a dict with user_id, activity_type, duration and an optional date.
+    """
+    rows = (
+        (r['user_id'], r['activity_type'], r['duration'], r.get('date'))
+        for r in records
+    )
+    return _bulk_insert('activities', ('user_id', 'activity_type', 'duration', 'date'),
+                        rows, chunk_size, return_ids, method)
+
+@instrumented
+def save_stress_logs_bulk(records, chunk_size=BULK_CHUNK_SIZE, return_ids=True, method='values'):
+    """Save many stress log entries (dicts with user_id, stress_score, optional date)."""
+    rows = ((r['user_id'], r['stress_score'], r.get('date')) for r in records)
+    return _bulk_insert('stress_logs', ('user_id', 'stress_score', 'date'),
+                        rows, chunk_size, return_ids, method)
+
+@instrumented
+def save_weight_logs_bulk(records, chunk_size=BULK_CHUNK_SIZE, return_ids=True, method='values'):
+    """Save many weight log entries (dicts with user_id, weight, optional date)."""
+    rows = ((r['user_id'], r['weight'], r.get('date')) for r in records)
+    return _bulk_insert('weight_logs', ('user_id', 'weight', 'date'),
+                        rows, chunk_size, return_ids, method)
+
+@instrumented
+def save_mobility_tests_bulk(records, chunk_size=BULK_CHUNK_SIZE, return_ids=True, method='values'):
+    """Save many mobility test results.
+
+    Each record is a dict with user_id, test_name, score and optional notes and date.
+    """
+    rows = (
+        (r['user_id'], r['test_name'], r['score'], r.get('notes', ''), r.get('date'))
+        for r in records
+    )
+    return _bulk_insert('mobility_tests', ('user_id', 'test_name', 'score', 'notes', 'date'),
+                        rows, chunk_size, return_ids, method)
+
+# Default per-section row limits for get_user_data (None means no limit)
+USER_DATA_LIMITS = {
+    'assessments': None,
+    'activities': None,
+    'stress_logs': None,
+    'weight_logs': None,
+    'active_challenges': None,
+}
+
+# Timestamp fields that come back as ISO strings from json_agg
+_JSON_DATE_FIELDS = ('date', 'start_date', 'end_date', 'timestamp')
+
+_USER_DATA_SQL = """
+    SELECT u.name, u.email, u.created_at,
+           COALESCE(a.rows, '[]'::json) AS assessments,
+           COALESCE(act.rows, '[]'::json) AS activities,
+           COALESCE(s.rows, '[]'::json) AS stress_logs,
+           COALESCE(w.rows, '[]'::json) AS weight_logs,
+           COALESCE(c.rows, '[]'::json) AS active_challenges
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT json_agg(t ORDER BY t.date DESC) AS rows FROM (
+            SELECT date, stress_score, bmi, activity_level, physical_score, pain_points
+            FROM assessments
+            WHERE user_id = u.id AND (%(since)s::timestamp IS NULL OR date >= %(since)s)
             ORDER BY date DESC
-        """, (user_id,))
-        assessments = cur.fetchall()
-        
-        # Get activities with type info
-        cur.execute("""
-            SELECT date, activity_type, duration 
-            FROM activities 
-            WHERE user_id = %s 
+            LIMIT %(assessments)s
+        ) t
+    ) a ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(t ORDER BY t.date DESC) AS rows FROM (
+            SELECT date, activity_type, duration
+            FROM activities
+            WHERE user_id = u.id AND (%(since)s::timestamp IS NULL OR date >= %(since)s)
             ORDER BY date DESC
-        """, (user_id,))
-        activities = cur.fetchall()
-        
-        # Get stress logs with proper formatting
-        cur.execute("""
-            SELECT date, stress_score 
-            FROM stress_logs 
-            WHERE user_id = %s 
+            LIMIT %(activities)s
+        ) t
+    ) act ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(t ORDER BY t.date DESC) AS rows FROM (
+            SELECT date, stress_score
+            FROM stress_logs
+            WHERE user_id = u.id AND (%(since)s::timestamp IS NULL OR date >= %(since)s)
             ORDER BY date DESC
-        """, (user_id,))
-        stress_logs = cur.fetchall()
-        
-        # Get weight logs with proper formatting
-        cur.execute("""
-            SELECT date, weight 
-            FROM weight_logs 
-            WHERE user_id = %s 
+            LIMIT %(stress_logs)s
+        ) t
+    ) s ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(t ORDER BY t.date DESC) AS rows FROM (
+            SELECT date, weight
+            FROM weight_logs
+            WHERE user_id = u.id AND (%(since)s::timestamp IS NULL OR date >= %(since)s)
             ORDER BY date DESC
-        """, (user_id,))
-        weight_logs = cur.fetchall()
-        
-        # Get active challenges with progress
-        cur.execute("""
-            SELECT challenge_name, start_date, end_date, status, progress 
-            FROM challenges 
-            WHERE user_id = %s AND status = 'active' 
+            LIMIT %(weight_logs)s
+        ) t
+    ) w ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT json_agg(t ORDER BY t.start_date DESC) AS rows FROM (
+            SELECT challenge_name, start_date, end_date, status, progress
+            FROM challenges
+            WHERE user_id = u.id AND status = 'active'
             ORDER BY start_date DESC
-        """, (user_id,))
-        active_challenges = cur.fetchall()
-        
-        # Get chat history
-        cur.execute("""
-            SELECT role, content, timestamp 
-            FROM chat_history 
-            WHERE user_id = %s 
-            ORDER BY timestamp DESC 
-            LIMIT 15
-        """, (user_id,))
-        chat_history = cur.fetchall()
-        
-        return {
-            'name': basic_info['name'],
-            'email': basic_info['email'],
-            'created_at': basic_info['created_at'],
-            'assessments': assessments,
-            'activities': activities,
-            'stress_logs': stress_logs,
-            'weight_logs': weight_logs,
-            'active_challenges': active_challenges,
-            'chat_history': chat_history
-        }
-        
-    finally:
+            LIMIT %(active_challenges)s
+        ) t
+    ) c ON TRUE
+    WHERE u.id = %(user_id)s
+"""
+
+def _parse_json_dates(rows):
+    """Turn the ISO timestamps produced by json_agg back into datetimes."""
+    for row in rows:
+        for field in _JSON_DATE_FIELDS:
+            if isinstance(row.get(field), str):
+                row[field] = datetime.fromisoformat(row[field])
+    return rows
+
+def _get_user_data_single_query(user_id, limits, since):
+    """Build the whole user profile in one round trip with json_agg."""
+    params = dict(USER_DATA_LIMITS)
+    params.update(limits or {})
+    params['user_id'] = user_id
+    params['since'] = since
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(_USER_DATA_SQL, params)
+        row = cur.fetchone()
         cur.close()
-        conn.close()
 
+    if not row:
+        return None
+
+    user_data = dict(row)
+    for section in USER_DATA_LIMITS:
+        user_data[section] = _parse_json_dates(user_data[section])
+    return user_data
+
+@cached_reader(DATA)
+@instrumented
+def get_user_data(user_id: int, single_query: bool = False, limits: dict = None, since: datetime = None) -> dict:
+    """Get all user data including challenges
+
+    With single_query=True the profile is built in one SQL statement. `limits`
+    overrides the per-section row limits in USER_DATA_LIMITS and `since` keeps
+    only log rows dated on or after it (challenges are not windowed). Chat
+    messages are not part of the profile, so new messages leave it cached;
+    read them with get_chat_history.
+    """
+    if single_query:
+        return _get_user_data_single_query(user_id, limits, since)
+
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            # Get basic user info
+            cur.execute("""
+                SELECT name, email, created_at
+                FROM users
+                WHERE id = %s
+            """, (user_id,))
+            basic_info = cur.fetchone()
+
+            if not basic_info:
+                return None
+
+            # Get assessments with proper ordering
+            cur.execute("""
+                SELECT date, stress_score, bmi, activity_level, physical_score, pain_points
+                FROM assessments
+                WHERE user_id = %s
+                ORDER BY date DESC
+            """, (user_id,))
+            assessments = cur.fetchall()
+
+            # Get activities with type info
+            cur.execute("""
+                SELECT date, activity_type, duration
+                FROM activities
+                WHERE user_id = %s
+                ORDER BY date DESC
+            """, (user_id,))
+            activities = cur.fetchall()
+
+            # Get stress logs with proper formatting
+            cur.execute("""
+                SELECT date, stress_score
+                FROM stress_logs
+                WHERE user_id = %s
+                ORDER BY date DESC
+            """, (user_id,))
+            stress_logs = cur.fetchall()
+
+            # Get weight logs with proper formatting
+            cur.execute("""
+                SELECT date, weight
+                FROM weight_logs
+                WHERE user_id = %s
+                ORDER BY date DESC
+            """, (user_id,))
+            weight_logs = cur.fetchall()
+
+            # Get active challenges with progress
+            cur.execute("""
+                SELECT challenge_name, start_date, end_date, status, progress
+                FROM challenges
+                WHERE user_id = %s AND status = 'active'
+                ORDER BY start_date DESC
+            """, (user_id,))
+            active_challenges = cur.fetchall()
+
+            return {
+                'name': basic_info['name'],
+                'email': basic_info['email'],
+                'created_at': basic_info['created_at'],
+                'assessments': assessments,
+                'activities': activities,
+                'stress_logs': stress_logs,
+                'weight_logs': weight_logs,
+                'active_challenges': active_challenges
+            }
+
+        finally:
+            cur.close()
+
+@instrumented
 def save_chat_message(user_id: int, role: str, content: str):
     """Save a chat message to the database"""
-    conn = get_db_connection()
-    with conn.cursor() as cur:
-        cur.execute("""
-            INSERT INTO chat_history (user_id, role, content)
-            VALUES (%s, %s, %s)
-            RETURNING id
-        """, (user_id, role, content))
-        message_id = cur.fetchone()['id']
-    conn.commit()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            execute_prepared(cur, 'insert_chat_message', (user_id, role, content))
+            message_id = cur.fetchone()['id']
+        conn.commit()
+    invalidate_user(user_id, (CHAT,))
     return message_id
 
+@cached_reader(CHAT)
+@instrumented
 def get_chat_history(user_id: int, limit: int = 15):
     """Get recent chat history for a user"""
-    conn = get_db_connection()
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT role, content, timestamp 
-            FROM chat_history 
-            WHERE user_id = %s 
-            ORDER BY timestamp DESC 
-            LIMIT %s
-        """, (user_id, limit))
-        return cur.fetchall()
-
-def init_chat_table():
-    """Initialize chat history table"""
-    conn = get_db_connection()
-    with conn.cursor() as cur:
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS chat_history (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id),
-                role VARCHAR(50),
-                content TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-    conn.commit()
+    flush_chat_writes(user_id)
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            execute_prepared(cur, 'get_chat_history', (user_id, limit))
+            return cur.fetchall()
 
+@instrumented
 def debug_list_users():
     """Debug function to list all users in the database"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT id, name, email FROM users")
-        users = cur.fetchall()
-        return users
-    except Exception as e:
-        print(f"Error querying users: {e}")
-        return []
-    finally:
-        cur.close()
-        conn.close()
-
+    with get_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT id, name, email FROM users")
+            users = cur.fetchall()
+            return users
+        except Exception as e:
+            print(f"Error querying users: {e}")
+            return []
+        finally:
+            cur.close()
+
+@instrumented
 def debug_check_user(email: str):
     """Debug function to check user data in database"""
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)  # Use RealDictCursor
-    try:
-        # Check users table
-        cur.execute("SELECT * FROM users WHERE email = %s", (email,))
-        user_data = cur.fetchone()
-        
-        if user_data:
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)  # Use RealDictCursor
+        try:
+            # Check users table
+            cur.execute("SELECT * FROM users WHERE email = %s", (email,))
+            user_data = cur.fetchone()
+
+            if user_data:
+                return {
+                    "found": True,
+                    "user_data": dict(user_data)  # Convert RealDictRow to dict
+                }
             return {
-                "found": True,
-                "user_data": dict(user_data)  # Convert RealDictRow to dict
+                "found": False,
+                "user_data": None
             }
-        return {
-            "found": False,
-            "user_data": None
-        }
-    finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+        finally:
+            cur.close()
@@ -0,0 +1,213 @@
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from functools import wraps
+from urllib.parse import urlsplit, urlunsplit
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# Periodic export: log a snapshot and/or rewrite a Prometheus textfile every N seconds
+METRICS_INTERVAL = float(os.getenv("DB_METRICS_INTERVAL", "0"))
+METRICS_TEXTFILE = os.getenv("DB_METRICS_TEXTFILE")
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+logger = logging.getLogger("healthyremote.db")
+slow_query_logger = logging.getLogger("healthyremote.db.slow")
+
+
+class _Histogram:
+    """Fixed-bucket latency histogram with count, sum, max and row totals."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+
+    def observe(self, elapsed_ms, rows=None, error=False):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if rows:
+            self.rows += rows
+        if error:
+            self.errors += 1
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'buckets': dict(zip([*map(str, LATENCY_BUCKETS_MS), '+Inf'], self.buckets)),
+        }
+
+
+_calls = {}
+_acquire = _Histogram()
+_lock = threading.Lock()
+
+
+def count_rows(result):
+    """Best-effort row count of a data-access result."""
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])  # (rows, next_cursor) pages
+    if isinstance(result, dict):
+        return sum(len(v) for v in result.values() if isinstance(v, list)) or 1
+    if hasattr(result, 'shape'):
+        return result.shape[0]  # DataFrames and arrays from the columnar readers
+    return 1
+
+
+def record_call(name, elapsed, rows=None, error=False):
+    """Record one data-access call and log it if it was slow."""
+    elapsed_ms = elapsed * 1000
+    with _lock:
+        histogram = _calls.get(name)
+        if histogram is None:
+            histogram = _calls[name] = _Histogram()
+        histogram.observe(elapsed_ms, rows, error)
+    if elapsed_ms >= SLOW_QUERY_MS:
+        slow_query_logger.warning(json.dumps({
+            'event': 'slow_query',
+            'function': name,
+            'duration_ms': round(elapsed_ms, 3),
+            'rows': rows,
+            'error': error,
+            'threshold_ms': SLOW_QUERY_MS,
+        }))
+
+
+def record_acquire(elapsed):
+    """Record how long a caller waited for a pooled connection."""
+    with _lock:
+        _acquire.observe(elapsed * 1000)
+
+
+def instrumented(func):
+    """Record call count, latency and rows returned for a data-access function."""
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            record_call(name, time.perf_counter() - start, error=True)
+            raise
+        record_call(name, time.perf_counter() - start, count_rows(result))
+        return result
+    return wrapper
+
+
+def get_metrics_snapshot():
+    """Return all counters as a JSON-serializable dict."""
+    with _lock:
+        return {
+            'timestamp': time.time(),
+            'slow_query_ms': SLOW_QUERY_MS,
+            'functions': {name: h.snapshot() for name, h in sorted(_calls.items())},
+            'connection_acquire': _acquire.snapshot(),
+        }
+
+
+def log_metrics_snapshot(level=logging.INFO):
+    """Emit the current snapshot as one structured log line."""
+    logger.log(level, json.dumps({'event': 'db_metrics', **get_metrics_snapshot()}, default=str))
+
+
+def export_prometheus():
+    """Render the counters in the Prometheus text exposition format."""
+    snapshot = get_metrics_snapshot()
+    lines = [
+        "# TYPE healthyremote_db_call_duration_ms histogram",
+    ]
+
+    def histogram_lines(metric, labels, data):
+        cumulative = 0
+        for bound, count in data['buckets'].items():
+            cumulative += count
+            lines.append(f'{metric}_bucket{{{labels}le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{{labels.rstrip(",")}}} {data["total_ms"]}')
+        lines.append(f'{metric}_count{{{labels.rstrip(",")}}} {data["count"]}')
+
+    for name, data in snapshot['functions'].items():
+        histogram_lines("healthyremote_db_call_duration_ms", f'function="{name}",', data)
+    lines.append("# TYPE healthyremote_db_call_errors_total counter")
+    for name, data in snapshot['functions'].items():
+        lines.append(f'healthyremote_db_call_errors_total{{function="{name}"}} {data["errors"]}')
+    lines.append("# TYPE healthyremote_db_rows_returned_total counter")
+    for name, data in snapshot['functions'].items():
+        lines.append(f'healthyremote_db_rows_returned_total{{function="{name}"}} {data["rows"]}')
+    lines.append("# TYPE healthyremote_db_connection_acquire_ms histogram")
+    histogram_lines("healthyremote_db_connection_acquire_ms", "", snapshot['connection_acquire'])
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(path=METRICS_TEXTFILE):
+    """Atomically write the Prometheus export (for node_exporter's textfile collector)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(export_prometheus())
+    os.replace(tmp_path, path)
+
+
+_reporter = None
+
+
+def start_metrics_reporter(interval=METRICS_INTERVAL):
+    """Start a daemon thread that exports the metrics every `interval` seconds."""
+    global _reporter
+    if interval <= 0 or _reporter is not None:
+        return
+
+    def report():
+        while True:
+            time.sleep(interval)
+            try:
+                log_metrics_snapshot()
+                if METRICS_TEXTFILE:
+                    write_prometheus_textfile()
+            except Exception:
+                logger.exception("Failed to export database metrics")
+
+    _reporter = threading.Thread(target=report, name="db-metrics-reporter", daemon=True)
+    _reporter.start()
+
+
+def reset_metrics():
+    global _acquire
+    with _lock:
+        _calls.clear()
+        _acquire = _Histogram()
+
+
+# password=... in a keyword DSN (value bare or single-quoted) or a URL query string
+_KEYWORD_PASSWORD = re.compile(r"(\bpassword\s*=\s*)(?:'(?:[^'\\]|\\.)*'|[^\s&']+)", re.IGNORECASE)
+
+
+def redact_dsn(dsn):
+    """Hide the password in a database URL or keyword DSN before logging it."""
+    dsn = _KEYWORD_PASSWORD.sub(r"\1***", dsn)
+    if "://" not in dsn:
+        return dsn
+    parts = urlsplit(dsn)
+    if parts.password is None:
+        return dsn
+    netloc = parts.netloc.replace(f":{parts.password}@", ":***@")
+    return urlunsplit(parts._replace(netloc=netloc))
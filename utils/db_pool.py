@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from .prepared import PreparingConnection
+from .db_metrics import logger, record_acquire, redact_dsn, start_metrics_reporter
+
+# Pool sizing and health-check settings (override through environment variables)
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10"))
+POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))
+
+# Errors that mean the connection itself is unusable and must not go back to the pool
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of psycopg2 connections."""
+
+    def __init__(self, dsn, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 acquire_timeout=POOL_ACQUIRE_TIMEOUT, healthcheck_after=POOL_HEALTHCHECK_AFTER):
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.healthcheck_after = healthcheck_after
+        self._pool = ThreadedConnectionPool(
+            min_size, max_size, dsn,
+            cursor_factory=RealDictCursor, connection_factory=PreparingConnection
+        )
+        # The semaphore makes callers wait for a free slot instead of getting PoolError
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._stats = {
+            'checkouts': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+            'waits': 0,
+            'acquire_time_total': 0.0,
+            'timeouts': 0,
+            'healthchecks': 0,
+            'discarded': 0,
+        }
+
+    def _is_healthy(self, conn):
+        """Check a connection before handing it out."""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        # Freshly opened or recently used connections skip the round trip
+        if last_used is None or time.monotonic() - last_used < self.healthcheck_after:
+            return True
+        self._stats['healthchecks'] += 1
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._stats['discarded'] += 1
+        self._pool.putconn(conn, close=True)
+
+    def acquire(self):
+        """Check a healthy connection out of the pool."""
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            self._stats['waits'] += 1
+            if not self._slots.acquire(timeout=self.acquire_timeout):
+                self._stats['timeouts'] += 1
+                raise PoolTimeout(
+                    f"No database connection available after {self.acquire_timeout}s "
+                    f"(pool size {self.max_size})"
+                )
+        try:
+            # ThreadedConnectionPool is already thread-safe; our lock only guards the counters
+            while True:
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    break
+                with self._lock:
+                    self._discard(conn)
+            with self._lock:
+                waited = time.monotonic() - start
+                self._stats['checkouts'] += 1
+                self._stats['acquire_time_total'] += waited
+                self._stats['in_use'] += 1
+                self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+            record_acquire(waited)
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        """Return a connection to the pool, resetting any open transaction."""
+        with self._lock:
+            self._stats['in_use'] -= 1
+            try:
+                if broken or conn.closed:
+                    self._discard(conn)
+                    return
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    try:
+                        conn.rollback()
+                    except CONNECTION_ERRORS:
+                        self._discard(conn)
+                        return
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+            finally:
+                self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it."""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def stats(self):
+        """Return a snapshot of pool usage counters."""
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot['max_size'] = self.max_size
+        snapshot['idle'] = len(self._pool._pool)
+        snapshot['avg_acquire_ms'] = (
+            snapshot['acquire_time_total'] / snapshot['checkouts'] * 1000 if snapshot['checkouts'] else 0.0
+        )
+        return snapshot
+
+    def close(self):
+        """Close every connection held by the pool."""
+        self._pool.closeall()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_database_url():
+    """Read the database URL from the environment."""
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL not found in environment variables")
+    return database_url
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                database_url = get_database_url()
+                logger.info("Creating connection pool for %s (max %d connections)",
+                            redact_dsn(database_url), POOL_MAX_SIZE)
+                _pool = ConnectionPool(database_url)
+                start_metrics_reporter()
+    return _pool
+
+
+def get_connection():
+    """Check out a pooled connection: use as `with get_connection() as conn:`."""
+    return get_pool().connection()
+
+
+def get_pool_stats():
+    """Return usage counters for the process-wide pool."""
+    if _pool is None:
+        return {'max_size': POOL_MAX_SIZE, 'checkouts': 0, 'in_use': 0, 'idle': 0}
+    return _pool.stats()
+
+
+def close_pool():
+    """Close the process-wide pool (used on shutdown and in scripts)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Points drawn per trace; longer series are reduced with LTTB before plotting
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "1000"))
+
+
+def lttb_indices(x, y, target):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps, in order.
+
+    The first and last points are always kept. The rest are split into
+    target - 2 buckets and each bucket keeps the point forming the largest
+    triangle with the previously kept point and the mean of the next bucket,
+    which preserves peaks and dips that plain striding would skip.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if target >= n or target < 3:
+        return np.arange(n)
+
+    # Bucket edges over the interior points 1 .. n-2
+    edges = np.linspace(1, n - 1, target - 1).astype(int)
+    # Mean of every bucket at once; bucket i uses the mean of bucket i + 1 as its
+    # third vertex, and the last bucket uses the final point
+    counts = np.diff(edges)
+    next_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts, x[-1])[1:]
+    next_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts, y[-1])[1:]
+
+    kept = np.empty(target, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(target - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # Twice the triangle areas for every candidate in the bucket
+        areas = np.abs(
+            (x[previous] - next_x[bucket]) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def downsample_frame(df, x, y, target=CHART_MAX_POINTS, band=None):
+    """Reduce df to about `target` rows picked by LTTB on (x, y).
+
+    `band` is an optional (min column, max column) pair: each kept row takes the
+    min/max of every row up to the next kept one, so the band never hides an
+    extreme that was dropped.
+    """
+    df = df.dropna(subset=[x, y]).sort_values(x).reset_index(drop=True)
+    if target is None or len(df) <= target:
+        return df
+
+    x_values = df[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values) or x_values.dtype == object:
+        x_values = pd.to_datetime(x_values).astype("int64")
+    kept = lttb_indices(x_values.to_numpy(dtype=float), df[y].to_numpy(dtype=float), target)
+
+    sampled = df.iloc[kept].reset_index(drop=True)
+    if band is not None:
+        low, high = band
+        sampled[low] = np.fmin.reduceat(df[low].to_numpy(dtype=float, na_value=np.nan), kept)
+        sampled[high] = np.fmax.reduceat(df[high].to_numpy(dtype=float, na_value=np.nan), kept)
+    return sampled
+
+
+def filter_window(rows, start=None, end=None, date_key='date'):
+    """Rows whose date falls in [start, end] (either bound optional).
+
+    Accepts a list of row dicts or a DataFrame, which is filtered with one mask.
+    """
+    if isinstance(rows, pd.DataFrame):
+        dates = pd.to_datetime(rows[date_key])
+        mask = pd.Series(True, index=rows.index)
+        if start is not None:
+            mask &= dates >= pd.Timestamp(start)
+        if end is not None:
+            mask &= dates < pd.Timestamp(end) + pd.Timedelta(days=1)
+        return rows[mask]
+
+    def day(value):
+        return value.date() if hasattr(value, 'date') else value
+
+    return [
+        row for row in rows
+        if (start is None or day(row[date_key]) >= start) and (end is None or day(row[date_key]) <= end)
+    ]
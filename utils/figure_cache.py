@@ -0,0 +1,50 @@
+import os
+
+import plotly.io as pio
+
+from .cache import LRUCache, add_invalidation_listener, get_user_version, DATA
+
+FIGURE_CACHE_MAX_BYTES = int(os.getenv("FIGURE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+FIGURE_CACHE_TTL = float(os.getenv("FIGURE_CACHE_TTL", "3600"))
+FIGURE_CACHE_MAX_ENTRIES = int(os.getenv("FIGURE_CACHE_MAX_ENTRIES", "2048"))
+
+# Figures are stored as UTF-8 encoded plotly JSON, so len() is the byte count the bound is about
+_figure_cache = LRUCache(FIGURE_CACHE_MAX_ENTRIES, FIGURE_CACHE_TTL, max_bytes=FIGURE_CACHE_MAX_BYTES)
+
+
+def figure_cache_key(user_id, chart, window=None, **options):
+    """Key a chart on the user's health-data version, its type, date window and build options."""
+    window = tuple(window) if window is not None else None
+    return (user_id, get_user_version(user_id, (DATA,)), chart, window, tuple(sorted(options.items())))
+
+
+def cached_figure(user_id, chart, build, window=None, **options):
+    """Return the chart's figure, calling `build()` only when it is not cached for this data version.
+
+    `build` should do all the work for the chart (reading, windowing,
+    downsampling, plotting), since a hit skips it entirely.
+    """
+    key = figure_cache_key(user_id, chart, window, **options)
+    found, serialized = _figure_cache.get(key)
+    if found:
+        return pio.from_json(serialized.decode(), skip_invalid=True)
+    fig = build()
+    _figure_cache.set(key, fig.to_json().encode())
+    return fig
+
+
+def get_figure_cache_stats():
+    return _figure_cache.stats()
+
+
+def clear_figure_cache():
+    _figure_cache.clear()
+
+
+def _on_invalidate(user_id, scopes):
+    # New logs bump the version, so old figures are unreachable; drop them now to free the bytes
+    if DATA in scopes:
+        _figure_cache.discard_where(lambda key: key[0] == user_id)
+
+
+add_invalidation_listener(_on_invalidate)
@@ -0,0 +1,36 @@
+import calendar
+
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = list(calendar.day_name)  # Monday first, matching ISODOW - 1
+HOURS = list(range(24))
+
+
+def weekday_hour_matrix(weekdays, hours, weights=None):
+    """Accumulate (weekday, hour) pairs into a 7x24 matrix; counts rows unless weights are given."""
+    matrix = np.zeros((7, 24))
+    weekdays = np.asarray(weekdays, dtype=int)
+    hours = np.asarray(hours, dtype=int)
+    # np.add.at accumulates repeated cells, unlike fancy-index assignment
+    np.add.at(matrix, (weekdays, hours), 1.0 if weights is None else np.asarray(weights, dtype=float))
+    return matrix
+
+
+def matrix_from_cells(cells, value=None):
+    """Matrix from pre-aggregated rows carrying weekday, hour and a value column (row count if None)."""
+    if not cells:
+        return np.zeros((7, 24))
+    weights = None if value is None else [row.get(value) or 0 for row in cells]
+    return weekday_hour_matrix([row['weekday'] for row in cells], [row['hour'] for row in cells], weights)
+
+
+def matrix_from_logs(activities, weighted=False, activity_type=None):
+    """Matrix from raw activity rows; weighted sums duration (minutes) instead of counting sessions."""
+    df = pd.DataFrame(activities, columns=['date', 'duration', 'activity_type'])
+    if activity_type is not None:
+        df = df[df['activity_type'] == activity_type]
+    dates = pd.to_datetime(df['date'])
+    valid = dates.notna().to_numpy()
+    weights = df['duration'].fillna(0).to_numpy()[valid] if weighted else None
+    return weekday_hour_matrix(dates[valid].dt.weekday, dates[valid].dt.hour, weights)
@@ -0,0 +1,119 @@
+import re
+
+# Intent names
+WEIGHT_RECORDS = 'weight_records'
+STRESS_RECORDS = 'stress_records'
+ACTIVITY_RECORDS = 'activity_records'
+ASSESSMENT_RECORDS = 'assessment_records'
+MOBILITY_RECORDS = 'mobility_records'
+CHALLENGE_RECORDS = 'challenge_records'
+ALL_RECORDS = 'all_records'
+DATA_REQUEST = 'data_request'
+HEALTH_JOURNEY = 'health_journey'
+CONTINUATION = 'continuation'
+OPEN_QUESTION = 'open_question'
+PERSONAL_STATEMENT = 'personal_statement'
+SHOW_VERB = 'show_verb'
+SHOW_RECORDS = 'show_records'
+RECORDS_PHRASE = 'records_phrase'
+SPANISH = 'spanish'
+
+# Intents that can be answered from the database without the model
+RECORDS_INTENTS = (
+    WEIGHT_RECORDS, STRESS_RECORDS, ACTIVITY_RECORDS, ASSESSMENT_RECORDS,
+    MOBILITY_RECORDS, CHALLENGE_RECORDS, ALL_RECORDS,
+)
+# Intents for which the model is told to lay out the user's records
+DATA_INTENTS = {DATA_REQUEST, ALL_RECORDS, ASSESSMENT_RECORDS}
+# Nouns that complete a "show ..." request
+_RECORDS_NOUNS = set(RECORDS_INTENTS) | {DATA_REQUEST}
+# Any of these sends the message to the model even if it names records
+_MODEL_INTENTS = {OPEN_QUESTION, PERSONAL_STATEMENT, CONTINUATION, HEALTH_JOURNEY}
+# Words that may surround the records nouns of a bare request ("all my stress logs please")
+_PHRASE_FILLERS = {"my", "all", "the", "and", "me", "please", "full", "entire", "recent", "latest"}
+
+# intent -> literal phrases (matched anywhere in the lowercased message)
+_PHRASES = {
+    WEIGHT_RECORDS: ["weight history", "weight records", "weight logs", "weight log", "my weight"],
+    STRESS_RECORDS: ["stress history", "stress records", "stress logs", "stress log", "my stress levels"],
+    ACTIVITY_RECORDS: ["activity history", "activity records", "activity logs", "activity log", "my activities"],
+    ASSESSMENT_RECORDS: ["my assessments", "assessment history", "assessment records"],
+    MOBILITY_RECORDS: ["mobility tests", "mobility history", "mobility records"],
+    CHALLENGE_RECORDS: ["my challenges", "active challenges", "challenge progress"],
+    ALL_RECORDS: ["my records", "my history", "my logs", "records", "history", "logs"],
+    DATA_REQUEST: ["my data", "my information", "info about me", "tell me about me",
+                   "everything about me", "all the info", "all my data"],
+    HEALTH_JOURNEY: ["my journey", "my health journey", "my progress", "my health progress", "my data story"],
+    CONTINUATION: ["continue"],
+}
+
+# intent -> regular expressions for matches that need word boundaries or anchors
+_PATTERNS = {
+    CONTINUATION: [r"^\s*(?:more|go on|what's next|proceed|continuar)\s*$"],
+    OPEN_QUESTION: [r"\b(?:why|how|should|advice|advise|recommend\w*|suggest\w*|improv\w*|explain\w*"
+                    r"|analy[sz]\w*|compare|trend\w*|insight\w*|tips?|interpret\w*)\b", r"\?"],
+    # How the user feels, or a statement about one of their measurements
+    PERSONAL_STATEMENT: [r"\b(?:i[’']?m|i am|i feel|i felt|i[’']?ve been|i have been|i was|i get|i keep"
+                         r"|feel\w*|worr\w*|anxi\w*|concern\w*|tired|exhausted|scared|afraid|upset|sad"
+                         r"|depress\w*|overwhelm\w*|stressed|struggl\w*|sick|hurt\w*|pain\w*|aches?|aching)\b",
+                         r"\bmy \w+(?: \w+)? (?:is|are|was|were|has|have|had|keeps|kept|says|said|seems|looks"
+                         r"|went|goes|got|gets)\b"],
+    SHOW_VERB: [r"\b(?:show|list|display|view|see|print|pull up|bring up|give me)\b"],
+    SPANISH: [r"\b(?:como|qué|porque|gracias|hola|por favor|puedes|continuar)\b"],
+}
+
+
+def _compile():
+    """Combine every phrase and pattern into one alternation with a group per alternative."""
+    alternatives = [(re.escape(p), intent) for intent, phrases in _PHRASES.items() for p in phrases]
+    alternatives += [(p, intent) for intent, patterns in _PATTERNS.items() for p in patterns]
+    # Longer alternatives first so e.g. "my health journey" wins over "my health"
+    alternatives.sort(key=lambda alt: -len(alt[0]))
+    group_intents = {f"i{n}": intent for n, (_, intent) in enumerate(alternatives)}
+    pattern = "|".join(f"(?P<i{n}>{regex})" for n, (regex, _) in enumerate(alternatives))
+    return re.compile(pattern), group_intents
+
+
+_MATCHER, _GROUP_INTENTS = _compile()
+
+
+def match_intents(message):
+    """Return the set of intents found in a message, in a single scan.
+
+    SHOW_RECORDS is added when a show/list/display verb comes before a
+    records noun, and RECORDS_PHRASE when the message is nothing but records
+    nouns ("my logs", "stress history and weight history").
+    """
+    text = message.lower().strip()
+    intents = set()
+    rest = []
+    end = 0
+    for m in _MATCHER.finditer(text):
+        intent = _GROUP_INTENTS[m.lastgroup]
+        if intent in _RECORDS_NOUNS:
+            if SHOW_VERB in intents:
+                intents.add(SHOW_RECORDS)
+            rest.append(text[end:m.start()])
+            end = m.end()
+        intents.add(intent)
+    if intents & _RECORDS_NOUNS:
+        rest.append(text[end:])
+        if all(word in _PHRASE_FILLERS for word in re.findall(r"\w+", " ".join(rest))):
+            intents.add(RECORDS_PHRASE)
+    return intents
+
+
+def local_records_intents(intents):
+    """The records intents to answer locally, or () if the model should answer.
+
+    Explicit requests ("show my stress history") and bare noun phrases ("my
+    logs", "stress history") qualify. Questions, statements about how the user
+    feels, and anything asking for analysis or advice go to the model. Only
+    the tables that were named are returned; ALL_RECORDS stands for "my
+    records"/"show my data".
+    """
+    if not intents & {SHOW_RECORDS, RECORDS_PHRASE} or intents & _MODEL_INTENTS:
+        return ()
+    if ALL_RECORDS in intents or DATA_REQUEST in intents:
+        return (ALL_RECORDS,)
+    return tuple(intent for intent in RECORDS_INTENTS if intent in intents)
@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+# Which entry of LLM_BACKENDS serves completions; LLM_BASE_URL can point either
+# backend at any OpenAI-compatible endpoint (e.g. benchmarks/llm_standin_server.py)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL")
+LOCAL_LLM_URL = "http://127.0.0.1:8089/v1"
+# Shared HTTP pool: connections are kept alive and reused across chat turns
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+# Concurrent completions allowed per process; extra callers wait up to LLM_ACQUIRE_TIMEOUT
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_ACQUIRE_TIMEOUT = float(os.getenv("LLM_ACQUIRE_TIMEOUT", "30"))
+# Retries on 429/5xx/connection errors, with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+
+logger = logging.getLogger("healthyremote.llm")
+
+
+class LLMBusy(Exception):
+    """Raised when no completion slot frees up within LLM_ACQUIRE_TIMEOUT."""
+
+
+def _openai_backend(http_client):
+    # Retries are handled here so they can be jittered and counted
+    return OpenAI(http_client=http_client, max_retries=0, base_url=LLM_BASE_URL)
+
+
+def _local_backend(http_client):
+    """OpenAI-compatible server on this machine; no real API key needed."""
+    return OpenAI(
+        http_client=http_client, max_retries=0,
+        base_url=LLM_BASE_URL or LOCAL_LLM_URL,
+        api_key=os.getenv("OPENAI_API_KEY") or "local"
+    )
+
+
+# name -> factory(http_client) returning an object with .chat.completions.create()
+LLM_BACKENDS = {
+    'openai': _openai_backend,
+    'local': _local_backend,
+}
+
+_backend_name = LLM_BACKEND
+_client = None
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def register_llm_backend(name, factory):
+    """Add a backend: factory(http_client) must return an OpenAI-compatible client."""
+    LLM_BACKENDS[name] = factory
+
+
+def set_llm_backend(name, base_url=None):
+    """Switch the process to another registered backend (e.g. 'local' for load tests)."""
+    global _backend_name, _client, LLM_BASE_URL
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}; registered: {sorted(LLM_BACKENDS)}")
+    with _client_lock:
+        _backend_name = name
+        if base_url is not None:
+            LLM_BASE_URL = base_url
+        _client = None
+
+
+def get_llm_client():
+    """Return the process-wide client of the configured backend, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS
+                    ),
+                    timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+                )
+                _client = LLM_BACKENDS[_backend_name](http_client)
+    return _client
+
+
+def _is_retryable(error):
+    if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def _backoff_delay(attempt, error):
+    """Seconds to wait before the next attempt; honours Retry-After on 429s."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _create_with_retry(call_stats, **kwargs):
+    client = get_llm_client()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return client.chat.completions.create(**kwargs)
+        except Exception as e:
+            if attempt == LLM_MAX_RETRIES or not _is_retryable(e):
+                raise
+            call_stats['retries'] += 1
+            delay = _backoff_delay(attempt, e)
+            logger.warning("LLM call failed (%s), retrying in %.2fs", type(e).__name__, delay)
+            time.sleep(delay)
+
+
+def _acquire_slot():
+    if not _slots.acquire(timeout=LLM_ACQUIRE_TIMEOUT):
+        raise LLMBusy(f"No LLM slot free after {LLM_ACQUIRE_TIMEOUT}s ({LLM_MAX_CONCURRENCY} in use)")
+
+
+def _record(model, call_stats):
+    """Fold one call into the per-model counters and log it."""
+    with _metrics_lock:
+        totals = _metrics.setdefault(model, {
+            'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'first_token_ms_total': 0.0, 'streams': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+        })
+        totals['calls'] += 1
+        totals['errors'] += call_stats['error']
+        totals['retries'] += call_stats['retries']
+        totals['total_ms'] += call_stats['duration_ms']
+        totals['max_ms'] = max(totals['max_ms'], call_stats['duration_ms'])
+        if call_stats.get('first_token_ms') is not None:
+            totals['streams'] += 1
+            totals['first_token_ms_total'] += call_stats['first_token_ms']
+        totals['prompt_tokens'] += call_stats['prompt_tokens']
+        totals['completion_tokens'] += call_stats['completion_tokens']
+    logger.debug(json.dumps({'event': 'llm_call', 'model': model, **call_stats}))
+
+
+def _new_call_stats():
+    return {'duration_ms': 0.0, 'retries': 0, 'error': False, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+
+def _add_usage(call_stats, usage):
+    if usage is not None:
+        call_stats['prompt_tokens'] = usage.prompt_tokens
+        call_stats['completion_tokens'] = usage.completion_tokens
+
+
+def chat_completion(messages, max_tokens=300, temperature=0.7, model=LLM_MODEL):
+    """Blocking chat completion through the shared client."""
+    call_stats = _new_call_stats()
+    _acquire_slot()
+    start = time.perf_counter()
+    try:
+        response = _create_with_retry(
+            call_stats, model=model, messages=messages, temperature=temperature, max_tokens=max_tokens
+        )
+        _add_usage(call_stats, response.usage)
+        return response
+    except Exception:
+        call_stats['error'] = True
+        raise
+    finally:
+        _slots.release()
+        call_stats['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        _record(model, call_stats)
+
+
+def stream_chat_completion(messages, max_tokens=300, temperature=0.7, model=LLM_MODEL):
+    """Yield streamed chat completion chunks; the slot is held until the stream is closed."""
+    call_stats = _new_call_stats()
+    call_stats['first_token_ms'] = None
+    _acquire_slot()
+    start = time.perf_counter()
+    stream = None
+    try:
+        stream = _create_with_retry(
+            call_stats, model=model, messages=messages, temperature=temperature,
+            max_tokens=max_tokens, stream=True, stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if call_stats['first_token_ms'] is None and chunk.choices and chunk.choices[0].delta.content:
+                call_stats['first_token_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            _add_usage(call_stats, getattr(chunk, "usage", None))
+            yield chunk
+    except Exception:
+        call_stats['error'] = True
+        raise
+    finally:
+        if stream is not None:
+            stream.close()
+        _slots.release()
+        call_stats['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        _record(model, call_stats)
+
+
+def get_llm_metrics():
+    """Per-model call counts, latency, time to first token and token usage."""
+    with _metrics_lock:
+        snapshot = {}
+        for model, totals in _metrics.items():
+            stats = dict(totals)
+            stats['avg_ms'] = round(totals['total_ms'] / totals['calls'], 3) if totals['calls'] else 0.0
+            stats['avg_first_token_ms'] = (
+                round(totals['first_token_ms_total'] / totals['streams'], 3) if totals['streams'] else 0.0
+            )
+            snapshot[model] = stats
+        return snapshot
+
+
+def reset_llm_metrics():
+    with _metrics_lock:
+        _metrics.clear()
@@ -0,0 +1,262 @@
+import threading
+
+from .db_pool import get_connection
+from .rollups import ROLLUP_SOURCES, backfill_rollups, refresh_rollup_day, schedule_full_recheck
+
+# Arbitrary key for pg_advisory_lock so only one process applies migrations at a time
+MIGRATION_LOCK_KEY = 7_241_001
+
+def _fill_missing_dates(cur):
+    """Migration step: date undated history rows now, refreshing the rollup days they land on."""
+    for table in ('assessments', 'activities', 'stress_logs', 'weight_logs', 'mobility_tests'):
+        cur.execute(f"""
+            UPDATE {table} SET date = CURRENT_TIMESTAMP WHERE date IS NULL
+            RETURNING user_id, date
+        """)
+        touched = {(row['user_id'], row['date'].date()) for row in cur.fetchall()}
+        if table in ROLLUP_SOURCES:
+            for user_id, day in touched:
+                refresh_rollup_day(cur, table, user_id, day)
+
+
+# Ordered list of (version, description, steps). A step is a SQL string or a
+# callable taking the cursor. Never edit an applied migration: append a new one.
+MIGRATIONS = [
+    (1, "baseline schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255),
+            email VARCHAR(255) UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS assessments (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            stress_score INTEGER,
+            bmi FLOAT,
+            activity_level VARCHAR(50),
+            physical_score INTEGER,
+            pain_points JSONB,
+            CONSTRAINT stress_score_range CHECK (stress_score BETWEEN 0 AND 10)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS activities (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            activity_type VARCHAR(50),
+            duration INTEGER,
+            CONSTRAINT duration_check CHECK (duration > 0)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS stress_logs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            stress_score INTEGER,
+            CONSTRAINT stress_log_score_range CHECK (stress_score BETWEEN 0 AND 10)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS weight_logs (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            weight FLOAT,
+            CONSTRAINT weight_check CHECK (weight > 0)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS mobility_tests (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            test_name VARCHAR(50),
+            score VARCHAR(50),
+            notes TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS challenges (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            challenge_name VARCHAR(100),
+            start_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            end_date TIMESTAMP,
+            status VARCHAR(20) DEFAULT 'active',
+            progress JSONB
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            role VARCHAR(50),
+            content TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (2, "per-user history indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_assessments_user_date ON assessments (user_id, date DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_activities_user_date ON activities (user_id, date DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_stress_logs_user_date ON stress_logs (user_id, date DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_weight_logs_user_date ON weight_logs (user_id, date DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_mobility_tests_user_date ON mobility_tests (user_id, date DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_challenges_user_start_date ON challenges (user_id, start_date DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_chat_history_user_timestamp ON chat_history (user_id, timestamp DESC)",
+    ]),
+    (3, "daily rollup tables for progress charts", [
+        """
+        CREATE TABLE IF NOT EXISTS stress_daily (
+            user_id INTEGER REFERENCES users(id),
+            day DATE,
+            entries INTEGER NOT NULL,
+            score_sum INTEGER NOT NULL,
+            score_min INTEGER,
+            score_max INTEGER,
+            PRIMARY KEY (user_id, day)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS weight_daily (
+            user_id INTEGER REFERENCES users(id),
+            day DATE,
+            weight FLOAT,
+            logged_at TIMESTAMP,
+            entries INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS activity_hourly (
+            user_id INTEGER REFERENCES users(id),
+            day DATE,
+            hour SMALLINT,
+            activity_type VARCHAR(50),
+            minutes INTEGER NOT NULL,
+            sessions INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day, hour, activity_type)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            source VARCHAR(50) PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        backfill_rollups,
+    ]),
+    (4, "rolling chat summaries", [
+        """
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id),
+            summary TEXT NOT NULL DEFAULT '',
+            last_message_id INTEGER NOT NULL DEFAULT 0,
+            turns_summarized INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (5, "rollup rechecks for rows committed behind the watermark", [
+        """
+        ALTER TABLE rollup_watermarks
+            ADD COLUMN IF NOT EXISTS recheck_from INTEGER,
+            ADD COLUMN IF NOT EXISTS recheck_to INTEGER,
+            ADD COLUMN IF NOT EXISTS recheck_xmax BIGINT
+        """,
+        schedule_full_recheck,
+    ]),
+    (6, "non-null history dates and (date, id) keyset indexes", [
+        _fill_missing_dates,
+        "ALTER TABLE assessments ALTER COLUMN date SET NOT NULL",
+        "ALTER TABLE activities ALTER COLUMN date SET NOT NULL",
+        "ALTER TABLE stress_logs ALTER COLUMN date SET NOT NULL",
+        "ALTER TABLE weight_logs ALTER COLUMN date SET NOT NULL",
+        "ALTER TABLE mobility_tests ALTER COLUMN date SET NOT NULL",
+        # Match the pages' ORDER BY date DESC, id DESC so they never sort
+        "CREATE INDEX IF NOT EXISTS idx_assessments_user_date_id ON assessments (user_id, date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_activities_user_date_id ON activities (user_id, date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_stress_logs_user_date_id ON stress_logs (user_id, date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_weight_logs_user_date_id ON weight_logs (user_id, date DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_mobility_tests_user_date_id ON mobility_tests (user_id, date DESC, id DESC)",
+        "DROP INDEX IF EXISTS idx_assessments_user_date",
+        "DROP INDEX IF EXISTS idx_activities_user_date",
+        "DROP INDEX IF EXISTS idx_stress_logs_user_date",
+        "DROP INDEX IF EXISTS idx_weight_logs_user_date",
+        "DROP INDEX IF EXISTS idx_mobility_tests_user_date",
+    ]),
+]
+
+_applied_in_process = False
+_migration_lock = threading.Lock()
+
+
+def get_applied_versions(cur):
+    """Return the set of migration versions already recorded in the database."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cur.fetchall()}
+
+
+def run_migrations(force=False):
+    """Apply pending migrations once per process; returns the versions applied."""
+    global _applied_in_process
+    if _applied_in_process and not force:
+        return []
+
+    with _migration_lock:
+        if _applied_in_process and not force:
+            return []
+
+        applied_now = []
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+            try:
+                applied = get_applied_versions(cur)
+                conn.commit()
+
+                for version, description, steps in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    # Each migration commits atomically together with its version row
+                    for step in steps:
+                        if callable(step):
+                            step(cur)
+                        else:
+                            cur.execute(step)
+                    cur.execute("""
+                        INSERT INTO schema_migrations (version, description)
+                        VALUES (%s, %s)
+                    """, (version, description))
+                    conn.commit()
+                    applied_now.append(version)
+            finally:
+                conn.rollback()
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+                conn.commit()
+                cur.close()
+
+        _applied_in_process = True
+        return applied_now
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    versions = run_migrations()
+    print(f"Applied migrations: {versions}" if versions else "Database schema is up to date")
@@ -0,0 +1,109 @@
+import os
+import re
+
+from psycopg2 import errors, extensions
+
+# Set DB_PREPARED_STATEMENTS=0 to fall back to plain parameterized queries
+USE_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "1") != "0"
+
+
+class PreparingConnection(extensions.connection):
+    """psycopg2 connection that remembers which statements it has prepared.
+
+    The set lives and dies with the server session, so a reconnect (a new
+    connection object) starts empty and statements are prepared again.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def _history_query(table):
+    return ("integer", f"SELECT * FROM {table} WHERE user_id = $1 ORDER BY date DESC")
+
+
+# name -> (parameter types, SQL with $n placeholders used once each, in order)
+PREPARED_STATEMENTS = {
+    'get_user_by_email': ("varchar", "SELECT id FROM users WHERE email = $1"),
+    'get_assessments': _history_query('assessments'),
+    'get_activities': _history_query('activities'),
+    'get_stress_logs': _history_query('stress_logs'),
+    'get_weight_logs': _history_query('weight_logs'),
+    'get_mobility_tests': _history_query('mobility_tests'),
+    'count_activities': ("integer", "SELECT COUNT(*) AS count FROM activities WHERE user_id = $1"),
+    'get_active_challenges': ("integer", """
+        SELECT * FROM challenges WHERE user_id = $1 AND status = 'active' ORDER BY start_date DESC
+    """),
+    'get_chat_history': ("integer, integer", """
+        SELECT role, content, timestamp FROM chat_history
+        WHERE user_id = $1 ORDER BY timestamp DESC, id DESC LIMIT $2
+    """),
+    'insert_assessment': ("integer, integer, float, varchar, integer, jsonb", """
+        INSERT INTO assessments (user_id, stress_score, bmi, activity_level, physical_score, pain_points)
+        VALUES ($1, $2, $3, $4, $5, $6) RETURNING id
+    """),
+    'insert_activity': ("integer, varchar, integer", """
+        INSERT INTO activities (user_id, activity_type, duration)
+        VALUES ($1, $2, $3) RETURNING id, date
+    """),
+    'insert_stress_log': ("integer, integer", """
+        INSERT INTO stress_logs (user_id, stress_score) VALUES ($1, $2) RETURNING id, date
+    """),
+    'insert_weight_log': ("integer, float", """
+        INSERT INTO weight_logs (user_id, weight) VALUES ($1, $2) RETURNING id, date
+    """),
+    'insert_mobility_test': ("integer, varchar, varchar, text", """
+        INSERT INTO mobility_tests (user_id, test_name, score, notes)
+        VALUES ($1, $2, $3, $4) RETURNING id
+    """),
+    'insert_chat_message': ("integer, varchar, text", """
+        INSERT INTO chat_history (user_id, role, content) VALUES ($1, $2, $3) RETURNING id
+    """),
+}
+
+# Equivalent psycopg2 queries for the unprepared path
+PLAIN_STATEMENTS = {
+    name: re.sub(r"\$\d+", "%s", sql) for name, (_, sql) in PREPARED_STATEMENTS.items()
+}
+
+
+def _is_stale_plan(error):
+    """The server's cached plan no longer matches the table (e.g. after a migration)."""
+    return isinstance(error, errors.FeatureNotSupported) and "cached plan" in str(error)
+
+
+def _execute(cur, name, params):
+    conn = cur.connection
+    if name not in conn.prepared:
+        param_types, sql = PREPARED_STATEMENTS[name]
+        cur.execute(f"PREPARE {name} ({param_types}) AS {sql}")
+        conn.prepared.add(name)
+    placeholders = ', '.join(['%s'] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders})", params)
+
+
+def execute_prepared(cur, name, params):
+    """Run a hot statement through a server-side prepared statement.
+
+    Statements are prepared lazily, once per connection. If the server has lost
+    them (e.g. a pooler reset the session) or their plan went stale, the
+    statement is re-prepared and retried once, provided it was the first
+    statement of the transaction.
+    """
+    conn = cur.connection
+    if not USE_PREPARED_STATEMENTS or not isinstance(conn, PreparingConnection):
+        cur.execute(PLAIN_STATEMENTS[name], params)
+        return
+
+    first_statement = conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+    try:
+        _execute(cur, name, params)
+    except (errors.InvalidSqlStatementName, errors.DuplicatePreparedStatement,
+            errors.FeatureNotSupported) as e:
+        if not first_statement or (isinstance(e, errors.FeatureNotSupported) and not _is_stale_plan(e)):
+            raise
+        conn.rollback()
+        cur.execute("DEALLOCATE ALL")
+        conn.prepared.clear()
+        _execute(cur, name, params)
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import re
+import unicodedata
+
+from .cache import LRUCache, add_invalidation_listener, get_user_version, DATA
+
+ASSISTANT_CACHE_TTL = float(os.getenv("ASSISTANT_CACHE_TTL", "1800"))
+ASSISTANT_CACHE_MAX_ENTRIES = int(os.getenv("ASSISTANT_CACHE_MAX_ENTRIES", "512"))
+# Prompts with fewer words left after normalization ("yes", "why", "hello") are
+# never cached, since their meaning depends on the conversation
+ASSISTANT_CACHE_MIN_WORDS = int(os.getenv("ASSISTANT_CACHE_MIN_WORDS", "3"))
+
+# Words that do not change what is being asked
+_FILLER_WORDS = {
+    "please", "can", "could", "would", "you", "me", "show", "tell", "give", "see",
+    "let", "i", "want", "to", "the", "a", "an", "hi", "hey", "hello", "about", "what", "is", "are",
+}
+
+# Whole (normalized) prompts that ask the same question; anything else is keyed on its own text
+_INTENT_ALIASES = {
+    "my data": "data", "all my data": "data", "all info": "data", "my information": "data",
+    "my records": "data", "everything": "data", "info": "data",
+    "my history": "history", "my logs": "history", "my assessments": "assessments",
+    "my journey": "journey", "my health journey": "journey", "my data story": "journey",
+    "my progress": "progress", "my health progress": "progress",
+}
+
+_response_cache = LRUCache(ASSISTANT_CACHE_MAX_ENTRIES, ASSISTANT_CACHE_TTL)
+
+
+def normalize_prompt(message):
+    """Lowercase, strip accents/punctuation and filler words, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", message.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    words = [w for w in re.findall(r"\w+", text) if w not in _FILLER_WORDS]
+    return " ".join(words)
+
+
+def prompt_fingerprint(message):
+    """Stable fingerprint of what a prompt asks for, or None if it should not be cached.
+
+    Only known aliases and prompts with at least ASSISTANT_CACHE_MIN_WORDS
+    content words get one.
+    """
+    normalized = normalize_prompt(message)
+    intent = _INTENT_ALIASES.get(normalized)
+    if intent:
+        token = f"intent:{intent}"
+    elif len(normalized.split()) >= ASSISTANT_CACHE_MIN_WORDS:
+        token = f"text:{normalized}"
+    else:
+        return None
+    return hashlib.sha1(token.encode("utf-8")).hexdigest()
+
+
+def response_cache_key(user_id, message, summary=""):
+    """Key an answer on the user's health-data version, the prompt fingerprint
+    and the rolling conversation summary.
+
+    The recent turns are left out on purpose: every exchange changes them, so
+    a repeated question would never hit. The summary only moves when older
+    turns are folded into it, and prompts short enough to lean on the last
+    turns ("why?", "yes") are never cached. Returns None for prompts that are
+    not cached (see prompt_fingerprint).
+    """
+    fingerprint = prompt_fingerprint(message)
+    if fingerprint is None:
+        return None
+    summary_hash = hashlib.sha1((summary or "").encode("utf-8")).hexdigest()
+    return (user_id, get_user_version(user_id, (DATA,)), fingerprint, summary_hash)
+
+
+def get_cached_response(key):
+    """Return (found, value) for a key built with response_cache_key()."""
+    if key is None:
+        return False, None
+    return _response_cache.get(key)
+
+
+def cache_response(key, value):
+    if key is not None:
+        _response_cache.set(key, value)
+
+
+def get_response_cache_stats():
+    return _response_cache.stats()
+
+
+def clear_response_cache():
+    _response_cache.clear()
+
+
+def _on_invalidate(user_id, scopes):
+    # Stale versions are already unreachable; this just frees their memory early
+    if DATA in scopes:
+        _response_cache.discard_where(lambda key: key[0] == user_id)
+
+
+add_invalidation_listener(_on_invalidate)
@@ -0,0 +1,229 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from .db_pool import get_connection
+from .db_metrics import instrumented
+from .chat_writer import add_message_listener, pending_chat_messages
+from .context_builder import truncate_to_tokens
+from .wellness_tips import (DAILY_TIPS, ERGONOMIC_GUIDELINES, STRETCHING_EXERCISES,
+                            WELLNESS_CHALLENGES, MOBILITY_TESTS)
+
+RETRIEVAL_CONTENT_K = int(os.getenv("RETRIEVAL_CONTENT_K", "3"))
+RETRIEVAL_CHAT_K = int(os.getenv("RETRIEVAL_CHAT_K", "3"))
+RETRIEVAL_SNIPPET_TOKENS = int(os.getenv("RETRIEVAL_SNIPPET_TOKENS", "80"))
+# Per-user chat indexes kept in memory, and turns kept per index
+RETRIEVAL_MAX_USERS = int(os.getenv("RETRIEVAL_MAX_USERS", "256"))
+RETRIEVAL_MAX_TURNS = int(os.getenv("RETRIEVAL_MAX_TURNS", "1000"))
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "for", "from", "have",
+    "how", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "so", "that", "the", "this",
+    "to", "was", "what", "when", "with", "you", "your",
+}
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercased terms without stopwords, with a crude plural/suffix strip."""
+    terms = []
+    for word in _WORD.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        for suffix in ("ing", "es", "s"):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        terms.append(word)
+    return terms
+
+
+class BM25Index:
+    """In-memory BM25 index that supports adding and removing documents one at a time."""
+
+    def __init__(self, k1=1.5, b=0.75, max_docs=None):
+        self.k1 = k1
+        self.b = b
+        self.max_docs = max_docs
+        self._docs = OrderedDict()  # doc_id -> (term counts, length, text, meta)
+        self._postings = {}         # term -> {doc_id: term count}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, doc_id, text, meta=None):
+        """Index a document; re-adding an existing id replaces it."""
+        counts = Counter(tokenize(text))
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove(doc_id)
+            self._docs[doc_id] = (counts, sum(counts.values()), text, meta or {})
+            self._total_length += sum(counts.values())
+            for term, count in counts.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+            # Bounded indexes forget their oldest documents first
+            while self.max_docs and len(self._docs) > self.max_docs:
+                self._remove(next(iter(self._docs)))
+
+    def _remove(self, doc_id):
+        counts, length, _, _ = self._docs.pop(doc_id)
+        self._total_length -= length
+        for term in counts:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def remove(self, doc_id):
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove(doc_id)
+
+    def search(self, query, k=3, skip=None):
+        """Return up to k (score, text, meta) hits, best first; only docs sharing a term score.
+
+        `skip(meta)` can veto individual documents.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._docs)
+            if not n or not terms:
+                return []
+            avg_length = self._total_length / n
+            scores = Counter()
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, count in postings.items():
+                    length = self._docs[doc_id][1]
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] += idf * count * (self.k1 + 1) / (count + norm)
+            hits = []
+            for doc_id, score in scores.most_common():
+                _, _, text, meta = self._docs[doc_id]
+                if skip and skip(meta):
+                    continue
+                hits.append((score, text, meta))
+                if len(hits) == k:
+                    break
+            return hits
+
+
+def _content_documents():
+    """Split the wellness content into short, self-contained snippets."""
+    for category in DAILY_TIPS:
+        for n, tip in enumerate(category["tips"]):
+            yield f"tip:{category['category']}:{n}", f"{category['category']} tip: {tip}"
+    for section, guidelines in ERGONOMIC_GUIDELINES.items():
+        for n, guideline in enumerate(guidelines):
+            yield f"ergonomics:{section}:{n}", f"Ergonomics ({section}): {guideline}"
+    for exercise in STRETCHING_EXERCISES:
+        yield f"stretch:{exercise['name']}", f"Stretch - {exercise['name']}: {'; '.join(exercise['instructions'])}"
+    for challenge in WELLNESS_CHALLENGES:
+        yield (f"challenge:{challenge['name']}",
+               f"Challenge - {challenge['name']} ({challenge['duration']} days): {challenge['description']}. "
+               f"Daily tasks: {'; '.join(challenge['daily_tasks'])}")
+    for test in MOBILITY_TESTS:
+        yield (f"mobility:{test['name']}",
+               f"Mobility test - {test['name']}: {test['description']}. Steps: {'; '.join(test['instructions'])}")
+
+
+_content_index = None
+_content_lock = threading.Lock()
+_chat_indexes = OrderedDict()
+_chat_lock = threading.Lock()
+
+
+def get_content_index():
+    """Return the process-wide index of the wellness content, building it on first use."""
+    global _content_index
+    if _content_index is None:
+        with _content_lock:
+            if _content_index is None:
+                index = BM25Index()
+                for doc_id, text in _content_documents():
+                    index.add(doc_id, text, {'source': 'content'})
+                _content_index = index
+    return _content_index
+
+
+def _chat_doc_id(role, content):
+    # Content-addressed ids make the live updates and the initial load idempotent
+    return f"{role}:{hashlib.sha1(content.encode('utf-8')).hexdigest()}"
+
+
+def _format_turn(role, content):
+    return f"{'User' if role == 'user' else 'Assistant'} said: {content}"
+
+
+@instrumented
+def _load_chat_index(user_id, index):
+    # Queued messages are indexed from memory instead of waiting for their insert
+    pending = pending_chat_messages(user_id)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT role, content FROM chat_history
+            WHERE user_id = %s
+            ORDER BY timestamp DESC, id DESC
+            LIMIT %s
+        """, (user_id, RETRIEVAL_MAX_TURNS))
+        rows = cur.fetchall()
+        cur.close()
+    turns = [(row['role'], row['content']) for row in reversed(rows)] + pending
+    for role, content in turns:
+        if content:
+            index.add(_chat_doc_id(role, content), _format_turn(role, content),
+                      {'source': 'chat', 'content': content})
+
+
+def get_chat_index(user_id):
+    """Return the user's chat index, loading it from the database on first use."""
+    with _chat_lock:
+        index = _chat_indexes.get(user_id)
+        if index is not None:
+            _chat_indexes.move_to_end(user_id)
+            return index
+        index = BM25Index(max_docs=RETRIEVAL_MAX_TURNS)
+        _chat_indexes[user_id] = index
+        while len(_chat_indexes) > RETRIEVAL_MAX_USERS:
+            _chat_indexes.popitem(last=False)
+    # Messages queued meanwhile are added by the listener; duplicates share an id
+    _load_chat_index(user_id, index)
+    return index
+
+
+def index_chat_message(user_id, role, content):
+    """Add a new message to the user's index if it is loaded (it is loaded lazily otherwise)."""
+    with _chat_lock:
+        index = _chat_indexes.get(user_id)
+    if index is not None and content:
+        index.add(_chat_doc_id(role, content), _format_turn(role, content), {'source': 'chat', 'content': content})
+
+
+def retrieve_snippets(user_id, query, exclude_turns=(), content_k=RETRIEVAL_CONTENT_K, chat_k=RETRIEVAL_CHAT_K):
+    """Top-k wellness snippets and earlier chat turns relevant to the query.
+
+    `exclude_turns` holds turn texts already in the prompt (possibly
+    truncated); those turns and the query itself are not returned, so chat
+    retrieval only brings back older context.
+    """
+    already_shown = [query] + [turn.rstrip(" …") for turn in exclude_turns]
+
+    def shown(meta):
+        return any(meta['content'].startswith(turn) for turn in already_shown)
+
+    hits = get_content_index().search(query, content_k)
+    if chat_k:
+        hits += get_chat_index(user_id).search(query, chat_k, skip=shown)
+    return [truncate_to_tokens(text, RETRIEVAL_SNIPPET_TOKENS) for _, text, _ in hits]
+
+
+add_message_listener(index_chat_message)
@@ -0,0 +1,393 @@
+import calendar
+from datetime import date
+
+from .db_pool import get_connection
+from .db_metrics import instrumented
+from .cache import cached_reader, invalidate_user, DATA
+
+# Raw tables that feed a rollup
+ROLLUP_SOURCES = ('stress_logs', 'weight_logs', 'activities')
+
+# Ids processed per transaction by the watermark job
+REFRESH_BATCH_SIZE = 50000
+
+# Every template recomputes whole (user_id, day) buckets from the raw rows, so
+# running it twice for the same day is harmless. {touched} is a query
+# returning the (user_id, day) pairs to recompute.
+_ROLLUP_SQL = {
+    'stress_logs': """
+        INSERT INTO stress_daily (user_id, day, entries, score_sum, score_min, score_max)
+        SELECT s.user_id, s.date::date, COUNT(*), SUM(s.stress_score),
+               MIN(s.stress_score), MAX(s.stress_score)
+        FROM stress_logs s
+        JOIN ({touched}) t ON s.user_id = t.user_id AND s.date >= t.day AND s.date < t.day + 1
+        GROUP BY s.user_id, s.date::date
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            entries = EXCLUDED.entries,
+            score_sum = EXCLUDED.score_sum,
+            score_min = EXCLUDED.score_min,
+            score_max = EXCLUDED.score_max
+        RETURNING user_id
+    """,
+    'weight_logs': """
+        INSERT INTO weight_daily (user_id, day, weight, logged_at, entries)
+        SELECT DISTINCT ON (w.user_id, w.date::date)
+               w.user_id, w.date::date, w.weight, w.date,
+               COUNT(*) OVER (PARTITION BY w.user_id, w.date::date)
+        FROM weight_logs w
+        JOIN ({touched}) t ON w.user_id = t.user_id AND w.date >= t.day AND w.date < t.day + 1
+        ORDER BY w.user_id, w.date::date, w.date DESC, w.id DESC
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            weight = EXCLUDED.weight,
+            logged_at = EXCLUDED.logged_at,
+            entries = EXCLUDED.entries
+        RETURNING user_id
+    """,
+    'activities': """
+        INSERT INTO activity_hourly (user_id, day, hour, activity_type, minutes, sessions)
+        SELECT a.user_id, a.date::date, EXTRACT(HOUR FROM a.date)::smallint,
+               COALESCE(a.activity_type, 'other'), SUM(a.duration), COUNT(*)
+        FROM activities a
+        JOIN ({touched}) t ON a.user_id = t.user_id AND a.date >= t.day AND a.date < t.day + 1
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (user_id, day, hour, activity_type) DO UPDATE SET
+            minutes = EXCLUDED.minutes,
+            sessions = EXCLUDED.sessions
+        RETURNING user_id
+    """,
+}
+
+_TOUCHED_DAY = "SELECT %(user_id)s::integer AS user_id, %(day)s::date AS day"
+_TOUCHED_RANGE = """
+    SELECT DISTINCT user_id, date::date AS day FROM {source}
+    WHERE id > %(low)s AND id <= %(high)s AND user_id IS NOT NULL AND date IS NOT NULL
+"""
+_TOUCHED_USER = """
+    SELECT DISTINCT user_id, date::date AS day FROM {source}
+    WHERE user_id = %(user_id)s AND date IS NOT NULL
+"""
+
+
+# Snapshot bounds, and whether a transaction other than ours is still running.
+# A row of a running transaction may already hold an id below MAX(id) and only
+# become visible after the watermark has moved past it.
+_SNAPSHOT_SQL = """
+    SELECT txid_snapshot_xmin(s) AS xmin, txid_snapshot_xmax(s) AS xmax,
+           EXISTS (
+               SELECT 1 FROM txid_snapshot_xip(s) AS x
+               WHERE x IS DISTINCT FROM txid_current_if_assigned()
+           ) AS in_flight
+    FROM txid_current_snapshot() AS s
+"""
+
+
+def _check_source(source):
+    if source not in _ROLLUP_SQL:
+        raise ValueError(f"No rollup defined for {source}")
+
+
+def refresh_rollup_day(cur, source, user_id, day):
+    """Recompute one user's day inside the caller's transaction (used by the writers).
+
+    Two writers logging the same day would each recompute the bucket without
+    the other's uncommitted row, and the last upsert would win. The advisory
+    lock, held until the caller commits, makes the second writer wait; its
+    recompute then runs on a fresh snapshot that includes the first one's row.
+    """
+    _check_source(source)
+    cur.execute(
+        "SELECT pg_advisory_xact_lock(%(user_id)s, hashtext(%(source)s || ':' || %(day)s::date))",
+        {'user_id': user_id, 'source': source, 'day': day}
+    )
+    cur.execute(_ROLLUP_SQL[source].format(touched=_TOUCHED_DAY), {'user_id': user_id, 'day': day})
+
+
+def _fold_range(cur, source, low, high):
+    """Recompute every (user, day) touched by ids in (low, high]; returns the user ids."""
+    touched = _TOUCHED_RANGE.format(source=source)
+    cur.execute(_ROLLUP_SQL[source].format(touched=touched), {'low': low, 'high': high})
+    return {row['user_id'] for row in cur.fetchall()}
+
+
+@instrumented
+def refresh_rollups(sources=ROLLUP_SOURCES, batch_size=REFRESH_BATCH_SIZE):
+    """Fold raw rows newer than each source's watermark into the rollups.
+
+    Returns the number of raw ids scanned per source. Safe to run from cron or
+    after bulk loads; concurrent runs serialize on the watermark row.
+
+    Ids are handed out before commit, so when other transactions are running
+    while a range is folded, some of its ids may land later. Such a range is
+    kept as a recheck and folded again (folds are idempotent) once every
+    transaction that was running then has finished.
+    """
+    scanned = {}
+    touched_users = set()
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for source in sources:
+            _check_source(source)
+            scanned[source] = 0
+            while True:
+                # Taken before this transaction writes anything
+                cur.execute(_SNAPSHOT_SQL)
+                settled_xmin = cur.fetchone()['xmin']
+                cur.execute("""
+                    INSERT INTO rollup_watermarks (source) VALUES (%s)
+                    ON CONFLICT (source) DO NOTHING
+                """, (source,))
+                cur.execute("""
+                    SELECT last_id, recheck_from, recheck_to, recheck_xmax
+                    FROM rollup_watermarks WHERE source = %s FOR UPDATE
+                """, (source,))
+                mark = cur.fetchone()
+                low = mark['last_id']
+                recheck = (mark['recheck_from'], mark['recheck_to'], mark['recheck_xmax'])
+                rechecked = False
+                if recheck[2] is not None and settled_xmin >= recheck[2]:
+                    touched_users.update(_fold_range(cur, source, recheck[0], recheck[1]))
+                    recheck = (None, None, None)
+                    rechecked = True
+
+                cur.execute(f"SELECT COALESCE(MAX(id), 0) AS high FROM {source}")
+                high = min(cur.fetchone()['high'], low + batch_size)
+                if high > low:
+                    touched_users.update(_fold_range(cur, source, low, high))
+                    cur.execute(_SNAPSHOT_SQL)
+                    snapshot = cur.fetchone()
+                    if snapshot['in_flight']:
+                        start = low if recheck[0] is None else min(recheck[0], low)
+                        recheck = (start, high, snapshot['xmax'])
+                elif not rechecked:
+                    conn.rollback()
+                    break
+
+                cur.execute("""
+                    UPDATE rollup_watermarks
+                    SET last_id = %s, recheck_from = %s, recheck_to = %s, recheck_xmax = %s,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE source = %s
+                """, (max(high, low), *recheck, source))
+                conn.commit()
+                if high <= low:
+                    break
+                scanned[source] += high - low
+        cur.close()
+
+    for user_id in touched_users:
+        invalidate_user(user_id)
+    return scanned
+
+
+@instrumented
+def rebuild_rollups(user_id, sources=ROLLUP_SOURCES):
+    """Recompute every rollup day of one user from the raw rows."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for source in sources:
+            _check_source(source)
+            touched = _TOUCHED_USER.format(source=source)
+            cur.execute(_ROLLUP_SQL[source].format(touched=touched), {'user_id': user_id})
+        conn.commit()
+        cur.close()
+    invalidate_user(user_id)
+
+
+def backfill_rollups(cur):
+    """Migration step: build the rollups for all existing rows.
+
+    Rows of transactions still running at that point are picked up by the
+    full recheck that a later migration schedules (schedule_full_recheck).
+    """
+    for source in ROLLUP_SOURCES:
+        cur.execute(f"SELECT COALESCE(MAX(id), 0) AS high FROM {source}")
+        high = cur.fetchone()['high']
+        _fold_range(cur, source, 0, high)
+        cur.execute("""
+            INSERT INTO rollup_watermarks (source, last_id) VALUES (%s, %s)
+            ON CONFLICT (source) DO UPDATE SET last_id = EXCLUDED.last_id
+        """, (source, high))
+
+
+def schedule_full_recheck(cur):
+    """Migration step: fold every id below each watermark again once running transactions end.
+
+    Repairs days that earlier watermark runs or the backfill skipped because
+    their rows committed after the watermark had passed them.
+    """
+    cur.execute(_SNAPSHOT_SQL)
+    xmax = cur.fetchone()['xmax']
+    cur.execute("""
+        UPDATE rollup_watermarks SET recheck_from = 0, recheck_to = last_id, recheck_xmax = %s
+        WHERE last_id > 0
+    """, (xmax,))
+
+
+def _run_query(sql, params):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+# Readers return rows shaped like the raw logs ('date' plus the value column),
+# oldest first, so the chart builders can plot them directly. The daily queries
+# are shared with the columnar readers in utils/columnar.py.
+
+STRESS_DAILY_SQL = """
+    SELECT day AS date, score_sum::float / entries AS stress_score,
+           score_min AS stress_min, score_max AS stress_max, entries
+    FROM stress_daily
+    WHERE user_id = %(user_id)s AND (%(since)s::date IS NULL OR day >= %(since)s)
+    ORDER BY day
+"""
+
+WEIGHT_DAILY_SQL = """
+    SELECT day AS date, weight, entries
+    FROM weight_daily
+    WHERE user_id = %(user_id)s AND (%(since)s::date IS NULL OR day >= %(since)s)
+    ORDER BY day
+"""
+
+
+@cached_reader(DATA)
+@instrumented
+def get_stress_daily(user_id, since=None):
+    """Daily stress mean/min/max for a user."""
+    return _run_query(STRESS_DAILY_SQL, {'user_id': user_id, 'since': since})
+
+
+@cached_reader(DATA)
+@instrumented
+def get_stress_weekly(user_id, since=None):
+    """Weekly stress mean/min/max for a user, aggregated from the daily rollup."""
+    return _run_query("""
+        SELECT date_trunc('week', day)::date AS date,
+               SUM(score_sum)::float / SUM(entries) AS stress_score,
+               MIN(score_min) AS stress_min, MAX(score_max) AS stress_max,
+               SUM(entries) AS entries
+        FROM stress_daily
+        WHERE user_id = %(user_id)s AND (%(since)s::date IS NULL OR day >= %(since)s)
+        GROUP BY 1
+        ORDER BY 1
+    """, {'user_id': user_id, 'since': since})
+
+
+@cached_reader(DATA)
+@instrumented
+def get_weight_daily(user_id, since=None):
+    """Last logged weight of each day for a user."""
+    return _run_query(WEIGHT_DAILY_SQL, {'user_id': user_id, 'since': since})
+
+
+@cached_reader(DATA)
+@instrumented
+def get_weight_weekly(user_id, since=None):
+    """Last logged weight of each week for a user."""
+    return _run_query("""
+        SELECT DISTINCT ON (date_trunc('week', day))
+               date_trunc('week', day)::date AS date, weight
+        FROM weight_daily
+        WHERE user_id = %(user_id)s AND (%(since)s::date IS NULL OR day >= %(since)s)
+        ORDER BY date_trunc('week', day), day DESC
+    """, {'user_id': user_id, 'since': since})
+
+
+@cached_reader(DATA)
+@instrumented
+def get_activity_daily(user_id, since=None):
+    """Activity minutes and sessions per day and activity type."""
+    return _run_query("""
+        SELECT day AS date, activity_type, SUM(minutes) AS minutes, SUM(sessions) AS sessions
+        FROM activity_hourly
+        WHERE user_id = %(user_id)s AND (%(since)s::date IS NULL OR day >= %(since)s)
+        GROUP BY day, activity_type
+        ORDER BY day
+    """, {'user_id': user_id, 'since': since})
+
+
+@cached_reader(DATA)
+@instrumented
+def get_activity_weekly(user_id, since=None):
+    """Activity minutes and sessions per week and activity type."""
+    return _run_query("""
+        SELECT date_trunc('week', day)::date AS date, activity_type,
+               SUM(minutes) AS minutes, SUM(sessions) AS sessions
+        FROM activity_hourly
+        WHERE user_id = %(user_id)s AND (%(since)s::date IS NULL OR day >= %(since)s)
+        GROUP BY 1, 2
+        ORDER BY 1
+    """, {'user_id': user_id, 'since': since})
+
+
+@cached_reader(DATA)
+@instrumented
+def get_activity_weekday_hour(user_id, activity_type=None):
+    """Activity minutes and sessions per weekday and hour, for the heatmap."""
+    rows = _run_query("""
+        SELECT (EXTRACT(ISODOW FROM day)::int - 1) AS weekday, hour,
+               SUM(minutes) AS minutes, SUM(sessions) AS sessions
+        FROM activity_hourly
+        WHERE user_id = %(user_id)s
+          AND (%(activity_type)s::varchar IS NULL OR activity_type = %(activity_type)s)
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """, {'user_id': user_id, 'activity_type': activity_type})
+    for row in rows:
+        row['day_of_week'] = calendar.day_name[row['weekday']]
+        row['time_of_day'] = row['hour']
+    return rows
+
+
+_HISTORY_TOTALS_SQL = """
+    SELECT
+        (SELECT json_build_object('entries', COUNT(*), 'first', MIN(date)::date, 'last', MAX(date)::date)
+         FROM assessments WHERE user_id = %(user_id)s) AS assessments,
+        (SELECT json_build_object('entries', SUM(entries), 'first', MIN(day), 'last', MAX(day),
+                                  'mean', SUM(score_sum)::float / SUM(entries),
+                                  'min', MIN(score_min), 'max', MAX(score_max))
+         FROM stress_daily WHERE user_id = %(user_id)s) AS stress_logs,
+        (SELECT json_build_object('entries', SUM(entries), 'first', MIN(day), 'last', MAX(day),
+                                  'mean', AVG(weight), 'min', MIN(weight), 'max', MAX(weight))
+         FROM weight_daily WHERE user_id = %(user_id)s) AS weight_logs,
+        (SELECT json_build_object('entries', SUM(sessions), 'minutes', SUM(minutes), 'last', MAX(day),
+                                  'top_types', (
+                                      SELECT json_agg(t.activity_type ORDER BY t.sessions DESC) FROM (
+                                          SELECT activity_type, SUM(sessions) AS sessions
+                                          FROM activity_hourly WHERE user_id = %(user_id)s
+                                          GROUP BY activity_type ORDER BY 2 DESC LIMIT 3
+                                      ) t))
+         FROM activity_hourly WHERE user_id = %(user_id)s) AS activities
+"""
+
+
+@cached_reader(DATA)
+@instrumented
+def get_history_totals(user_id):
+    """All-time statistics of each history section, from the rollups.
+
+    The assistant reads only the latest rows of each log, so the figures that
+    describe the whole history (entry counts, date range, mean/min/max) come
+    from here; the cost scales with days, not entries. Weight statistics are
+    over daily weights. Sections without data map to None.
+    """
+    row = _run_query(_HISTORY_TOTALS_SQL, {'user_id': user_id})[0]
+    totals = {}
+    for section, stats in row.items():
+        if not stats or not stats['entries']:
+            totals[section] = None
+            continue
+        for field in ('first', 'last'):
+            if stats.get(field):
+                stats[field] = date.fromisoformat(stats[field])
+        totals[section] = stats
+    return totals
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    print(f"Rollup refresh scanned ids: {refresh_rollups()}")
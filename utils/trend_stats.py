@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .cache import LRUCache
+
+# Rolling means drawn on the trend charts, in days
+TREND_MEAN_WINDOWS = (7, 30)
+# Days covered by the rolling min/max band
+TREND_BAND_WINDOW = 30
+# EWMA span in observations (smoothing factor 2 / (span + 1))
+TREND_EWMA_SPAN = int(os.getenv("TREND_EWMA_SPAN", "7"))
+TREND_STATS_MAX_SERIES = int(os.getenv("TREND_STATS_MAX_SERIES", "1024"))
+
+# Overlay name -> columns it draws
+OVERLAYS = {
+    'mean_7d': ('mean_7d',),
+    'mean_30d': ('mean_30d',),
+    'ewma': ('ewma',),
+    'band': ('band_min', 'band_max'),
+}
+STAT_COLUMNS = ('mean_7d', 'mean_30d', 'ewma', 'band_min', 'band_max')
+
+# Longest look-back any statistic needs when only the tail is recomputed
+_LOOKBACK = pd.Timedelta(days=max(TREND_MEAN_WINDOWS + (TREND_BAND_WINDOW,)))
+
+# (user_id, series) -> last computed frame; kept across data versions on purpose,
+# since new points only change the tail
+_stats_cache = LRUCache(TREND_STATS_MAX_SERIES, ttl=24 * 3600)
+
+
+def rolling_stats(dates, values):
+    """Rolling means and min/max of a series; windows are calendar days, whatever the gaps."""
+    series = pd.Series(np.asarray(values, dtype=float), index=pd.DatetimeIndex(dates))
+    stats = pd.DataFrame(index=series.index)
+    for days in TREND_MEAN_WINDOWS:
+        stats[f'mean_{days}d'] = series.rolling(f'{days}D').mean()
+    band = series.rolling(f'{TREND_BAND_WINDOW}D')
+    stats['band_min'] = band.min()
+    stats['band_max'] = band.max()
+    return stats.reset_index(drop=True)
+
+
+def ewma(values, seed=None):
+    """EWMA with adjust=False; `seed` is the EWMA of the points before these ones.
+
+    adjust=False makes the EWMA a plain recursion, so seeding it with the
+    previous value continues it exactly.
+    """
+    values = np.asarray(values, dtype=float)
+    if seed is None:
+        return pd.Series(values).ewm(span=TREND_EWMA_SPAN, adjust=False).mean().to_numpy()
+    return pd.Series(np.append(seed, values)).ewm(span=TREND_EWMA_SPAN, adjust=False).mean().to_numpy()[1:]
+
+
+def compute_overlays(dates, values):
+    """Every overlay column of a series, one vectorized pass per statistic."""
+    stats = rolling_stats(dates, values)
+    stats['ewma'] = ewma(values)
+    return stats[list(STAT_COLUMNS)]
+
+
+def _prepare(frame, value):
+    df = pd.DataFrame(frame).dropna(subset=['date', value])
+    # Columnar readers already hand over sorted datetime64 columns; skip the work then
+    if not pd.api.types.is_datetime64_any_dtype(df['date']):
+        df['date'] = pd.to_datetime(df['date'])
+    df[value] = df[value].astype(float)
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date', kind='stable')
+    return df.reset_index(drop=True)
+
+
+def _with_stats(df, stats):
+    return pd.concat([df, stats.set_axis(df.index)], axis=1)
+
+
+def add_trend_overlays(frame, value):
+    """Return the frame sorted oldest first, with every overlay column added."""
+    df = _prepare(frame, value)
+    return _with_stats(df, compute_overlays(df['date'], df[value]))
+
+
+def add_trend_overlays_incremental(user_id, series, frame, value):
+    """Like add_trend_overlays, but only recomputes what changed since the last call.
+
+    The last computed statistics of each (user, series) are kept. When the new
+    frame starts with the same points (the last day may have changed, as rollup
+    days do while logs come in), only the new tail is computed: rolling windows
+    over the tail plus a look-back of the longest window, and the EWMA continued
+    from its last kept value. Anything else, e.g. a backfill, gets a full pass.
+    """
+    df = _prepare(frame, value)
+    key = (user_id, series, value)
+    found, previous = _stats_cache.get(key)
+
+    keep = 0
+    if found and len(previous):
+        # Everything before the previous last day is assumed final if unchanged
+        keep = int(previous['date'].searchsorted(previous['date'].iloc[-1]))
+        unchanged = (
+            len(df) >= keep
+            and np.array_equal(df['date'].to_numpy()[:keep], previous['date'].to_numpy()[:keep])
+            and np.array_equal(df[value].to_numpy()[:keep], previous[value].to_numpy()[:keep])
+        )
+        if not unchanged:
+            keep = 0
+
+    if keep == 0:
+        stats = compute_overlays(df['date'], df[value])
+    else:
+        tail = df.iloc[keep:]
+        start = int(df['date'].searchsorted(tail['date'].iloc[0] - _LOOKBACK)) if len(tail) else keep
+        context = df.iloc[start:]
+        tail_stats = rolling_stats(context['date'], context[value]).iloc[keep - start:]
+        tail_stats['ewma'] = ewma(tail[value], seed=previous['ewma'].iloc[keep - 1])
+        stats = pd.concat([previous[list(STAT_COLUMNS)].iloc[:keep], tail_stats[list(STAT_COLUMNS)]],
+                          ignore_index=True).astype(float)
+
+    _stats_cache.set(key, _with_stats(df[['date', value]], stats))
+    return _with_stats(df, stats)
+
+
+def clear_trend_stats():
+    _stats_cache.clear()
@@ -2,9 +2,52 @@ import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
 
-def create_stress_trend_chart(stress_logs):
-    """Create a line chart showing stress levels over time."""
-    df = pd.DataFrame(stress_logs)
+from .downsampling import downsample_frame, CHART_MAX_POINTS
+from .heatmap import matrix_from_cells, matrix_from_logs, HOURS, WEEKDAYS
+from .trend_stats import add_trend_overlays, OVERLAYS
+
+# Overlay name -> (legend label, line style)
+_OVERLAY_STYLES = {
+    'mean_7d': ('7-day mean', dict(dash='dot', width=2)),
+    'mean_30d': ('30-day mean', dict(dash='dash', width=2)),
+    'ewma': ('EWMA', dict(width=2)),
+}
+
+def _with_overlays(df, value, overlays):
+    """Add the overlay columns unless the caller already computed them (e.g. incrementally)."""
+    needed = {column for name in overlays for column in OVERLAYS[name]}
+    if needed and not needed.issubset(df.columns):
+        df = add_trend_overlays(df, value)
+    return df
+
+def _add_overlay_traces(fig, df, overlays):
+    """Draw the rolling min/max band and the smoothed lines on a trend chart."""
+    if 'band' in overlays:
+        fig.add_trace(go.Scatter(
+            x=df['date'], y=df['band_max'],
+            mode='lines', line=dict(width=0), hoverinfo='skip', showlegend=False
+        ))
+        fig.add_trace(go.Scatter(
+            x=df['date'], y=df['band_min'],
+            mode='lines', line=dict(width=0), fill='tonexty',
+            fillcolor='rgba(128, 128, 128, 0.15)', hoverinfo='skip', name='30-day range'
+        ))
+    for name, (label, line) in _OVERLAY_STYLES.items():
+        if name in overlays:
+            fig.add_trace(go.Scatter(x=df['date'], y=df[name], mode='lines', line=line, name=label))
+
+def create_stress_trend_chart(stress_logs, max_points=CHART_MAX_POINTS, overlays=()):
+    """Create a line chart showing stress levels over time.
+
+    Accepts raw stress logs or daily/weekly rollup rows; rollup rows also carry
+    stress_min/stress_max, which are drawn as a band around the mean. Series
+    longer than max_points are downsampled with LTTB (None draws every point).
+    `overlays` names extra layers from trend_stats.OVERLAYS ('mean_7d',
+    'mean_30d', 'ewma', 'band'); they are computed on the full series first.
+    """
+    df = _with_overlays(pd.DataFrame(stress_logs), 'stress_score', overlays)
+    band = ('stress_min', 'stress_max') if {'stress_min', 'stress_max'}.issubset(df.columns) else None
+    df = downsample_frame(df, 'date', 'stress_score', max_points, band=band)
     
     fig = px.line(
         df,
@@ -13,32 +56,65 @@ def create_stress_trend_chart(stress_logs):
         title='Stress Level Trend',
         labels={'date': 'Date', 'stress_score': 'Stress Score'}
     )
+
+    if band:
+        fig.add_trace(go.Scatter(
+            x=df['date'], y=df['stress_max'],
+            mode='lines', line=dict(width=0), hoverinfo='skip', name='Max', showlegend=False
+        ))
+        fig.add_trace(go.Scatter(
+            x=df['date'], y=df['stress_min'],
+            mode='lines', line=dict(width=0), fill='tonexty',
+            fillcolor='rgba(99, 110, 250, 0.2)', hoverinfo='skip', name='Min', showlegend=False
+        ))
+    _add_overlay_traces(fig, df, overlays)
     
     fig.update_layout(
         height=400,
-        showlegend=False,
+        showlegend=bool(overlays),
         hovermode='x unified'
     )
     
     return fig
 
-def create_activity_heatmap(activity_logs):
-    """Create a heatmap showing activity patterns."""
-    df = pd.DataFrame(activity_logs)
-    
-    fig = px.density_heatmap(
-        df,
-        x='day_of_week',
-        y='time_of_day',
-        title='Activity Pattern Heatmap',
-        labels={'day_of_week': 'Day of Week', 'time_of_day': 'Time of Day'}
-    )
-    
+def create_activity_heatmap(activity_logs, z=None, activity_type=None):
+    """Create a weekday x hour heatmap showing activity patterns.
+
+    Accepts raw activity rows or pre-aggregated weekday/hour cells (e.g. the
+    rollup), as a list of dicts or a DataFrame. With `z` set the column is
+    summed ('sessions'/'minutes' for cells, 'duration' for raw rows) instead
+    of counting rows. `activity_type` keeps only rows of that type; cells
+    without an activity_type column are taken as already filtered.
+    """
+    if isinstance(activity_logs, pd.DataFrame):
+        activity_logs = activity_logs.to_dict('records')
+    activity_logs = list(activity_logs or [])
+    if len(activity_logs) and 'weekday' in activity_logs[0]:
+        if activity_type is not None and 'activity_type' in activity_logs[0]:
+            activity_logs = [row for row in activity_logs if row['activity_type'] == activity_type]
+        matrix = matrix_from_cells(activity_logs, z)
+    else:
+        matrix = matrix_from_logs(activity_logs, weighted=z == 'duration', activity_type=activity_type)
+    return create_weekday_hour_heatmap(matrix, (z or 'sessions').capitalize())
+
+def create_weekday_hour_heatmap(matrix, value_label='Sessions'):
+    """Render a 7x24 matrix; the figure has the same size however much activity it sums."""
+    fig = go.Figure(go.Heatmap(
+        z=matrix,
+        x=HOURS,
+        y=WEEKDAYS,
+        colorscale='Viridis',
+        colorbar=dict(title=value_label),
+        hovertemplate='%{y} %{x}:00<br>' + value_label + ': %{z:g}<extra></extra>'
+    ))
+
     fig.update_layout(
-        height=400,
-        showlegend=True
+        title='Activity Pattern Heatmap',
+        xaxis=dict(title='Time of Day', dtick=2),
+        yaxis=dict(title='Day of Week', autorange='reversed'),
+        height=400
     )
-    
+
     return fig
 
 def create_body_map(pain_points):
@@ -76,9 +152,13 @@ def create_body_map(pain_points):
     
     return html
 
-def create_weight_trend_chart(weight_logs):
-    """Create a line chart showing weight trend over time."""
-    df = pd.DataFrame(weight_logs)
+def create_weight_trend_chart(weight_logs, max_points=CHART_MAX_POINTS, overlays=()):
+    """Create a line chart showing weight trend over time, downsampled past max_points.
+
+    `overlays` works as in create_stress_trend_chart.
+    """
+    df = _with_overlays(pd.DataFrame(weight_logs), 'weight', overlays)
+    df = downsample_frame(df, 'date', 'weight', max_points)
     
     fig = px.line(
         df,
@@ -87,10 +167,11 @@ def create_weight_trend_chart(weight_logs):
         title='Weight Trend',
         labels={'date': 'Date', 'weight': 'Weight (kg)'}
     )
+    _add_overlay_traces(fig, df, overlays)
     
     fig.update_layout(
         height=400,
-        showlegend=False,
+        showlegend=bool(overlays),
         hovermode='x unified'
     )
     